@@ -0,0 +1,93 @@
+"""
+Benchmark the Corrector's deletion index against Norvig's original
+edit-generation approach.
+
+Usage: python benchmarks/corrector.py [corpus.txt]
+
+Without a corpus file a synthetic, Zipf-distributed corpus is generated
+from a fixed seed so that runs are comparable.
+"""
+import bisect
+import os
+import random
+import re as RE
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from stolat import Corrector
+
+def synthetic_corpus(size, vocabulary = 20000, seed = 0):
+  r = random.Random(seed)
+  letters = "abcdefghijklmnopqrstuvwxyz"
+  words = [''.join(r.choice(letters) for _ in range(r.randint(2, 10))) for _ in range(vocabulary)]
+  weights = [1.0 / (i + 1) for i in range(vocabulary)]
+  total = sum(weights)
+  cumulative = []
+  acc = 0.0
+  for w in weights:
+    acc += w / total
+    cumulative.append(acc)
+  return [words[min(bisect.bisect(cumulative, r.random()), vocabulary - 1)] for _ in range(size)]
+
+def misspell(word, r, letters):
+  """
+  Apply one or two random edits to a word.
+  """
+  for _ in range(r.randint(1, 2)):
+    i = r.randint(0, max(len(word) - 1, 0))
+    op = r.randint(0, 3)
+    if op == 0 and word:
+      word = word[:i] + word[i+1:]
+    elif op == 1 and len(word) > i + 1:
+      word = word[:i] + word[i+1] + word[i] + word[i+2:]
+    elif op == 2 and word:
+      word = word[:i] + r.choice(letters) + word[i+1:]
+    else:
+      word = word[:i] + r.choice(letters) + word[i:]
+  return word
+
+def norvig_correct(cor, word):
+  """
+  The original candidate search: generate every string within two edits
+  and keep the known ones.
+  """
+  def edits1(word):
+    splits     = [(word[:i], word[i:]) for i in range(len(word) + 1)]
+    deletes    = [a + b[1:] for a, b in splits if b]
+    transposes = [a + b[1] + b[0] + b[2:] for a, b in splits if len(b)>1]
+    replaces   = [a + c + b[1:] for a, b in splits for c in cor._alphabet if b]
+    inserts    = [a + c + b     for a, b in splits for c in cor._alphabet]
+    return set(deletes + transposes + replaces + inserts)
+  known = cor._known
+  candidates = (known([word]) or known(edits1(word)) or
+                set(e2 for e1 in edits1(word) for e2 in edits1(e1) if e2 in cor._corpus) or [word])
+  return max(candidates, key=cor._corpus.get)
+
+def timed(f, words):
+  start = time.time()
+  out = [f(w) for w in words]
+  return out, time.time() - start
+
+if __name__ == "__main__":
+  if len(sys.argv) > 1:
+    corpus = RE.findall('[a-z]+', open(sys.argv[1]).read().lower())
+  else:
+    corpus = synthetic_corpus(200000)
+
+  start = time.time()
+  cor = Corrector(corpus)
+  print "Built %r in %.2fs" % (cor, time.time() - start)
+
+  r = random.Random(1)
+  letters = ''.join(sorted(cor._alphabet))
+  sample = [misspell(r.choice(corpus), r, letters) for _ in range(200)]
+
+  indexed, t_index = timed(cor._correct, sample)
+  original, t_norvig = timed(lambda w: norvig_correct(cor, w), sample)
+
+  print "Norvig edits:   %8.3f ms/word" % (1000 * t_norvig / len(sample))
+  print "Deletion index: %8.3f ms/word" % (1000 * t_index / len(sample))
+  print "Speed-up:       %8.1fx" % (t_norvig / max(t_index, 1e-9))
+  print "Same corrections: %s" % (indexed == original)
@@ -0,0 +1,83 @@
+"""
+Measure the memory taken by the MatchResults of a large stream, against the
+dict-backed representation they used to have.
+
+Usage: python benchmarks/matchresult.py [tokens]
+
+A recursive DET/CN/NP/VP grammar is run over a synthetic stream generated
+from a fixed seed, and every result it produces is kept, as a consumer
+collecting the output would.
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from stolat import word, re, token
+from stolat.MatchResult import MatchResult
+
+class DictResult(dict):
+  """
+  The previous representation: a dict subclass with a per-instance
+  __dict__ holding the type.
+  """
+
+  def __init__(self, token_type):
+    self._token_type = token_type
+    super(DictResult, self).__init__()
+
+def grammar():
+  det = (re("the|a|an")%"det" >> "DET")
+  cn = ((word("big") + re("dog|cat|man")%"noun") >> "CN") ^ 1
+  np = ((token("DET")%"det" + token("CN")%"cn") >> "NP") ^ 2
+  vp = ((token("NP")%"subj" + re("chased|saw")%"verb") >> "VP") ^ 2
+  return det | cn | np | vp
+
+def synthetic_stream(size, seed = 0):
+  r = random.Random(seed)
+  words = "the a an big dog cat man chased saw and then quickly".split()
+  return [r.choice(words) for _ in range(size)]
+
+def size_of(results):
+  """
+  Return the bytes held by the given results themselves, counting shared
+  field name tuples once.
+  """
+  total = 0
+  shared = set()
+  for r in results:
+    total += sys.getsizeof(r)
+    if isinstance(r, MatchResult):
+      total += sys.getsizeof(r._values)
+      if id(r._fields) not in shared:
+        shared.add(id(r._fields))
+        total += sys.getsizeof(r._fields)
+    else:
+      total += sys.getsizeof(r.__dict__)
+  return total
+
+def as_dicts(results):
+  converted = []
+  for r in results:
+    d = DictResult(r.token_type)
+    for k, v in r.items():
+      d[k] = v
+    converted.append(d)
+  return converted
+
+if __name__ == "__main__":
+  size = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+  stream = synthetic_stream(size)
+
+  start = time.time()
+  results = [t for t in grammar()(stream) if isinstance(t, MatchResult)]
+  elapsed = time.time() - start
+  print "Matched %d tokens into %d results in %.2fs" % (size, len(results), elapsed)
+
+  compact = size_of(results)
+  dicts = size_of(as_dicts(results))
+  print "Dict-backed results: %8.1f MB (%5.0f bytes each)" % (dicts / 1e6, float(dicts) / len(results))
+  print "Compact results:     %8.1f MB (%5.0f bytes each)" % (compact / 1e6, float(compact) / len(results))
+  print "Saving:              %8.1fx" % (float(dicts) / compact)
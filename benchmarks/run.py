@@ -0,0 +1,284 @@
+"""
+Run the benchmark suite: a set of representative grammars, and the
+Corrector, over synthetic corpora generated from fixed seeds.
+
+Usage: python benchmarks/run.py [--tokens N] [--repeat N] [--only NAME ...]
+                                [--save FILE] [--compare FILE [--threshold PCT]]
+
+For each case this reports throughput in tokens per second, the latency
+of single tokens at several percentiles, and how far resident memory
+rises above what the case's setup (corpus, grammar, Corrector model)
+already takes while the tokens are run through, with the setup's own
+size alongside. Every case runs in a process of its own. Results can be
+saved as a JSON baseline and later runs compared against it; with
+--compare the exit status is 1 if any case got slower by more than the
+threshold. baseline.json holds the figures for the default settings;
+timings only compare on the machine they were taken on, so save a new
+baseline before comparing elsewhere.
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from stolat import word, re, token, Corrector
+from stolat.Matcher import Matcher
+
+from corrector import synthetic_corpus, misspell
+
+timer = timeit.default_timer
+
+MONTHS = "january february march april may june july august september october november december".split()
+
+def literal_union(size, seed):
+  """
+  A union of 200 single-word rules over a Zipf corpus.
+  """
+  corpus = synthetic_corpus(size, 5000, seed)
+  vocabulary = sorted(set(corpus))
+  r = random.Random(seed)
+  m = Matcher(vocabulary[0])
+  for w in r.sample(vocabulary[1:], 199):
+    m = m | Matcher(w, "LIT")
+  return corpus, m
+
+def gapped(size, seed):
+  """
+  Three-word sequences whose words may be spread over a ten token window.
+  """
+  corpus = synthetic_corpus(size, 500, seed)
+  vocabulary = sorted(set(corpus))
+  r = random.Random(seed)
+  rules = []
+  for i in range(20):
+    a, b, c = r.sample(vocabulary[:100], 3)
+    rules.append(((word(a) + word(b) + word(c)%"last") >> ("GAP%d" % i)) ^ 7)
+  m = rules[0]
+  for rule in rules[1:]:
+    m = m | rule
+  return corpus, m
+
+def regexps(size, seed):
+  """
+  Prices, dates and numbers picked out by regexp rules.
+  """
+  r = random.Random(seed)
+  filler = synthetic_corpus(size, 2000, seed)
+  toks = []
+  for w in filler:
+    roll = r.random()
+    if roll < 0.05:
+      toks.extend(["price", "$%d.%02d" % (r.randint(1, 999), r.randint(0, 99))])
+    elif roll < 0.1:
+      toks.extend(["month", "of", r.choice(MONTHS)])
+    elif roll < 0.15:
+      toks.append(str(r.randint(0, 10000)))
+    else:
+      toks.append(w)
+  toks = toks[:size]
+  price = ((word("price") + re("\$(?P<dollars>\d+)(\.(?P<cents>\d{2}))?")%"amount") >> "PRICEX") ^ 2
+  timex = ((word("month") + re("|".join(MONTHS))%"month") >> "TIMEX") ^ 3
+  number = re("\d+$")%"n" >> "NUM"
+  year = re("(19|20)\d\d$")%"y" >> "YEAR"
+  money = re("\$\d+")%"m" >> "MONEY"
+  return toks, price | timex | number | year | money
+
+def recursive(size, seed):
+  """
+  The determiner, noun, noun phrase and verb phrase grammar of the
+  examples, over generated sentences.
+  """
+  r = random.Random(seed)
+  toks = []
+  while len(toks) < size:
+    toks.append("the")
+    if r.random() < 0.5:
+      toks.append(r.choice(["black", "big"]))
+    toks.append(r.choice(["cat", "dog", "mouse", "man"]))
+    toks.append(r.choice(["miaows", "runs", "sleeps", "barks"]))
+  det = (word("the") % "determiner") >> "DET"
+  cn = (re("(cat|dog|mouse)") % "n") >> "CN"
+  np = (token("DET") + token("CN")%"cn") >> "NP"
+  vp = (token("NP")%"subj" + re(".+")%"v") >> "VP"
+  return toks[:size], det | cn | np | vp^2
+
+def corrector(rate):
+  """
+  Return a case running the Corrector over text with the given share of
+  words misspelled.
+  """
+  def case(size, seed):
+    corpus = synthetic_corpus(200000, 20000, seed)
+    cor = Corrector(corpus)
+    r = random.Random(seed + 1)
+    letters = ''.join(sorted(cor._alphabet))
+    text = synthetic_corpus(size, 20000, seed + 2)
+    return [misspell(w, r, letters) if r.random() < rate else w for w in text], cor
+  case.__doc__ = "The Corrector with %d%% of words misspelled." % (100 * rate)
+  return case
+
+CASES = [
+  ("literal-union", literal_union),
+  ("gapped", gapped),
+  ("regexps", regexps),
+  ("recursive", recursive),
+  ("corrector-1", corrector(0.01)),
+  ("corrector-10", corrector(0.1)),
+  ("corrector-30", corrector(0.3)),
+]
+
+def latencies(process, tokens):
+  """
+  Stream the tokens through process, returning the time taken between
+  one token being pulled and the next, which is the time spent on it.
+  """
+  stamps = []
+  def source():
+    for tok in tokens:
+      stamps.append(timer())
+      yield tok
+  for _ in process(source()):
+    pass
+  stamps.append(timer())
+  return [b - a for a, b in zip(stamps, stamps[1:])]
+
+def run_memory(process, tokens):
+  """
+  Run the tokens through process, returning the resident memory before
+  the run and the most it rose above that during it, in kilobytes.
+
+  On Linux the high water mark is reset first, so the peak is the run's
+  own. Elsewhere only the process-wide peak is known, and the rise is
+  counted from the peak of the setup, so a run that stays below what the
+  setup needed shows as 0.
+  """
+  gc.collect()
+  try:
+    with open('/proc/self/clear_refs', 'w') as f:
+      f.write('5')
+  except IOError:
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    for _ in process(iter(tokens)):
+      pass
+    return before, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before
+  before = _status_kb('VmRSS')
+  for _ in process(iter(tokens)):
+    pass
+  return before, _status_kb('VmHWM') - before
+
+def _status_kb(field):
+  with open('/proc/self/status') as f:
+    for line in f:
+      if line.startswith(field + ':'):
+        return int(line.split()[1])
+
+def percentile(ordered, p):
+  return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+def measure(name, size, repeat = 3, seed = 0):
+  """
+  Build and run one case in this process, returning its figures. The
+  case is built afresh for every run, so each starts with a cold
+  Corrector cache, and the fastest run counts.
+  """
+  case = dict(CASES)[name]
+  elapsed = None
+  for _ in range(repeat):
+    toks, process = case(size, seed)
+    # Throughput is timed through the plain callable, without stamping
+    start = timer()
+    for _ in process(iter(toks)):
+      pass
+    elapsed = min(elapsed, timer() - start) if elapsed is not None else timer() - start
+
+  toks, process = case(size, seed)
+  lat = sorted(latencies(process, toks))
+  latency = dict((label, 1e6 * percentile(lat, p))
+                 for label, p in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('max', 1.0)))
+
+  # Memory is measured on a run of its own, with the last one's figures
+  # and the time stamps freed
+  toks = process = lat = None
+  toks, process = case(size, seed)
+  setup_kb, run_kb = run_memory(process, toks)
+  return {
+    'tokens': len(toks),
+    'seconds': elapsed,
+    'tokens_per_second': len(toks) / elapsed,
+    'latency_us': latency,
+    'setup_rss_kb': setup_kb,
+    'run_rss_kb': run_kb,
+  }
+
+def run_isolated(name, size, repeat):
+  """
+  Measure a case in a child process, so that its memory is its own.
+  """
+  output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--case', name,
+                                    '--tokens', str(size), '--repeat', str(repeat)])
+  return json.loads(output)
+
+def report(name, figures, baseline = None):
+  lat = figures['latency_us']
+  line = "%-14s %10.0f tok/s  p50 %7.1fus  p90 %7.1fus  p99 %8.1fus  max %9.1fus  rss +%6.1f MB (setup %6.1f MB)" % (
+    name, figures['tokens_per_second'], lat['p50'], lat['p90'], lat['p99'], lat['max'],
+    figures['run_rss_kb'] / 1024.0, figures['setup_rss_kb'] / 1024.0)
+  if baseline is not None:
+    line += "  %+6.1f%%" % change(baseline, figures)
+  print line
+
+def change(baseline, figures):
+  """
+  Return the change in throughput from the baseline, as a percentage.
+  """
+  return 100.0 * (figures['tokens_per_second'] / baseline['tokens_per_second'] - 1)
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description = "Run the stolat benchmark suite.")
+  parser.add_argument('--tokens', type = int, default = 50000, help = "tokens per corpus")
+  parser.add_argument('--repeat', type = int, default = 3, help = "runs per case, the fastest counting")
+  parser.add_argument('--only', nargs = '+', metavar = 'NAME', help = "run only these cases")
+  parser.add_argument('--save', metavar = 'FILE', help = "save the results as a baseline")
+  parser.add_argument('--compare', metavar = 'FILE', help = "compare against a saved baseline")
+  parser.add_argument('--threshold', type = float, default = 10.0,
+                      help = "slowdown, in percent, counted as a regression")
+  parser.add_argument('--case', help = argparse.SUPPRESS)
+  args = parser.parse_args()
+
+  if args.case:
+    print json.dumps(measure(args.case, args.tokens, args.repeat))
+    sys.exit(0)
+
+  names = args.only or [name for name, case in CASES]
+  unknown = set(names) - set(dict(CASES))
+  if unknown:
+    parser.error("unknown cases: %s" % ", ".join(sorted(unknown)))
+
+  baselines = {}
+  if args.compare:
+    baselines = json.load(open(args.compare))['cases']
+
+  results = {}
+  regressions = []
+  for name in names:
+    results[name] = run_isolated(name, args.tokens, args.repeat)
+    baseline = baselines.get(name)
+    report(name, results[name], baseline)
+    if baseline is not None and change(baseline, results[name]) < -args.threshold:
+      regressions.append(name)
+
+  if args.save:
+    with open(args.save, 'w') as f:
+      json.dump({'tokens': args.tokens, 'python': sys.version.split()[0], 'cases': results},
+                f, indent = 2, sort_keys = True)
+
+  if regressions:
+    print "Slower than the baseline by more than %.0f%%: %s" % (args.threshold, ", ".join(regressions))
+    sys.exit(1)
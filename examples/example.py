@@ -3,9 +3,8 @@ from stolat.Corrector import Corrector
 
 import re as RE
 
-def words(text): return RE.findall('[a-z]+', text.lower())
-
-corpus = words(file('big.txt').read())
+# Read the corpus lazily, a word at a time, rather than into memory
+corpus = Tokenizer('[a-z]+', RE.I, lower = True, offsets = False).file('big.txt')
 
 corrector_filter = Corrector(corpus)
 
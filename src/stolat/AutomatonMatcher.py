@@ -0,0 +1,153 @@
+"""
+AutomatonMatcher.py
+
+A matcher that compiles a pattern into a token-level automaton, so that
+every partial match advances by one step per token rather than the whole
+window being scanned again.
+"""
+
+from Pattern import Pattern
+from PatternMatcher import PatternMatcher
+from SequencePattern import SequencePattern
+from Token import _span, _covering
+
+class AutomatonMatcher(PatternMatcher):
+  """
+  A drop-in replacement for PatternMatcher that produces the same results
+  at a per-token cost independent of the buffer length.
+
+  The pattern is flattened into its leaves in text order. State j holds the
+  most recent partial match of the first j+1 leaves, as a chain of
+  (start, previous, value, position) links. A token that satisfies leaf j extends the
+  partial match that state j-1 held before the token arrived. This is the
+  same greedy, newest-first binding that SequencePattern.scan makes, so a
+  full match is reported whenever its first token is still in the window.
+
+  >>> from Pattern import word
+  >>> from RegexpPattern import re
+  >>> m = ((word("month") + re("february|march")%"month") >> "TIMEX") ^ 1
+  >>> list(m.compile()("the month of march".split()))
+  ['the', 'month', 'of', 'march', TIMEX{'month': {'month': 'march'}}]
+
+  Recursive grammars compile too, and give the same stream as before:
+  >>> from TokenPattern import token
+  >>> det = (word("the") % "determiner") >> "DET"
+  >>> np = (token("DET") + re("cat|dog")%"cn") >> "NP"
+  >>> list((det | np).compile()("the cat".split()))
+  ['the', DET{}, DET{}, 'cat', NP{'cn': {'cn': 'cat'}}]
+  >>> list((det | np)("the cat".split()))
+  ['the', DET{}, DET{}, 'cat', NP{'cn': {'cn': 'cat'}}]
+  """
+
+  def __init__(self, pattern, type_name, keep_original = True):
+    super(AutomatonMatcher, self).__init__(pattern, type_name, keep_original)
+    self._tests = [_leaf_test(p) for p in reversed(pattern._leaves())]
+
+  def _anchor(self):
+    # The automaton has to see every token to keep its states current
+    return None
+
+  def _regexp_anchor(self):
+    return None
+
+  def _fuzzy_anchor(self):
+    return None
+
+  def compile(self):
+    return self
+
+  def _new_state(self):
+    # The clock and the partial match held for each prefix of the leaves
+    return [-1, [None] * len(self._tests)]
+
+  def _match(self, buf, context):
+    """
+    Advance the automaton by the newest token in the buffer. This must be
+    called exactly once per token pushed, as Matcher and UnionMatcher do.
+    """
+    state = context.state(self, self._new_state)
+    state[0] += 1
+    clock, states = state
+    tok = buf[0]
+    tests = self._tests
+
+    # Walk the leaves backwards so each state extends its predecessor's
+    # value from before this token
+    for j in xrange(len(tests) - 1, -1, -1):
+      v = tests[j](tok)
+      if v is not None:
+        if j == 0:
+          states[0] = (clock, None, v, clock)
+        else:
+          prev = states[j-1]
+          if prev is None:
+            states[j] = None
+          else:
+            states[j] = (prev[0], prev, v, clock)
+
+    # Only report a match whose first token is still inside the window
+    final = states[-1]
+    if final is None or final[0] <= clock - len(buf):
+      return []
+
+    values = []
+    link = final
+    while link is not None:
+      values.append(link[2])
+      link = link[1]
+    result = self._result(_bind(self._pattern, iter(values)))
+    if _span(tok) is not None:
+      # Each link remembers when its token arrived, so where it is now
+      bound = []
+      link = final
+      while link is not None:
+        bound.append(buf[clock - link[3]])
+        link = link[1]
+      result._span = _covering(bound)
+    return [result]
+
+def compilable(pattern):
+  """
+  Return whether the given pattern tree can be run as an automaton.
+
+  >>> from Pattern import word
+  >>> compilable(word("the") + word("dog"))
+  True
+  """
+  try:
+    for p in pattern._leaves():
+      _leaf_test(p)
+  except TypeError:
+    return False
+  return True
+
+def _leaf_test(pattern):
+  """
+  Return the single-token test for a leaf pattern. Patterns that override
+  scan without providing a matching single-token test cannot be compiled.
+  """
+  for klass in type(pattern).__mro__:
+    if '_match_token' in klass.__dict__:
+      return pattern._match_token
+    if 'scan' in klass.__dict__ or 'matches' in klass.__dict__:
+      break
+  raise TypeError("cannot compile pattern of type %s"%type(pattern).__name__)
+
+def _bind(pattern, values):
+  """
+  Rebuild the value SequencePattern.scan would bind from the leaf values,
+  given in scan order.
+  """
+  if isinstance(pattern, SequencePattern):
+    result = {}
+    for p in pattern.subpatterns:
+      r = _bind(p, values)
+      if p.field and not p.field in result:
+        result[p.field] = r
+    return result
+  return next(values)
+
+# Doctest magic
+if __name__ == "__main__":
+  import doctest
+  doctest.testmod()
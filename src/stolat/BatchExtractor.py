@@ -0,0 +1,85 @@
+"""
+BatchExtractor.py
+
+Runs a matcher pipeline over many documents at once, fanning the work out
+over a pool of worker processes.
+"""
+import itertools
+import multiprocessing
+
+from Parallel import bounded_imap
+from Pipeline import Pipeline
+
+class BatchExtractor(object):
+  """
+  A callable object that takes an iterable of documents and yields, for each
+  document in order, the list of tokens and results the pipeline produces
+  for it.
+
+  The pipeline is a tokenizer (by default, splitting on whitespace), an
+  optional Corrector, a matcher and an optional ResultFilter, run as a
+  Pipeline. It is sent to each worker once, when the pool starts, and
+  documents are then sent in chunks. Only a bounded number of chunks are
+  in flight at a time, so arbitrarily long inputs can be streamed through.
+  With prune set, the matcher is cut down to the rules the filter's types
+  need first, which can change what is matched; see Pipeline.
+
+  The tokenizer has to be a module-level function so that it can be sent to
+  the workers.
+
+  >>> from Pattern import word
+  >>> from ResultFilter import ResultFilter
+  >>> cn = (word("the") + word("dog")%"noun") >> "CN"
+  >>> batch = BatchExtractor(cn, result_filter = ResultFilter(["CN"]),
+  ...                        processes = 2, chunksize = 2)
+  >>> list(batch(["the dog barked", "a cat", "the dog and the dog"]))
+  [[CN{'noun': 'dog'}], [], [CN{'noun': 'dog'}, CN{'noun': 'dog'}]]
+  """
+
+  def __init__(self, matcher, tokenize = None, corrector = None,
+               result_filter = None, processes = None, chunksize = 100,
+               max_pending = None, prune = False):
+    self._pipeline = Pipeline(matcher, tokenize, corrector, result_filter,
+                              prune)
+    self._processes = processes or multiprocessing.cpu_count()
+    self._chunksize = chunksize
+    self._max_pending = max_pending or 2 * self._processes
+    super(BatchExtractor, self).__init__()
+
+  def __call__(self, documents):
+    pool = multiprocessing.Pool(self._processes, _init_worker,
+                                (self._pipeline,))
+    chunks = self._chunks(documents)
+    try:
+      for results in bounded_imap(pool, _extract_chunk, chunks,
+                                  self._max_pending):
+        for r in results:
+          yield r
+    finally:
+      pool.terminate()
+
+  def _chunks(self, documents):
+    documents = iter(documents)
+    while True:
+      chunk = list(itertools.islice(documents, self._chunksize))
+      if not chunk:
+        return
+      yield chunk
+
+# The pipeline each worker process was started with
+_pipeline = None
+
+def _init_worker(pipeline):
+  global _pipeline
+  _pipeline = pipeline
+
+def _extract_chunk(documents):
+  """
+  Run the worker's pipeline over a chunk of documents.
+  """
+  return [_pipeline(doc) for doc in documents]
+
+# Doctest magic
+if __name__ == "__main__":
+  import doctest
+  doctest.testmod()
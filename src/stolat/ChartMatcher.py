@@ -0,0 +1,209 @@
+"""
+ChartMatcher.py
+
+A matcher that runs a recursive grammar as an incremental, bottom-up chart
+parser, building each constituent once.
+"""
+import collections
+
+from Matcher import Matcher
+from MatchResult import MatchResult
+from Pattern import Pattern
+from PatternMatcher import PatternMatcher
+from UnionMatcher import UnionMatcher
+from AutomatonMatcher import _leaf_test, _bind
+from Token import _span, _covering
+
+class ChartMatcher(Matcher):
+  """
+  Runs a grammar of token(), word() and re() rules over a chart of the
+  constituents found in the last few tokens, rather than re-scanning a
+  window that results are pushed back into.
+
+  Every token is a constituent spanning its own position. As each token
+  arrives, every rule whose newest leaf accepts a new constituent is
+  chained back over the constituents ending where that one starts, and
+  each complete chain becomes a new constituent, which may complete
+  further rules in turn. A constituent is remembered by its span and
+  type, so each is built once however many ways it can be derived, and
+  is reported once, as soon as its last token arrives.
+
+  Unlike the window matchers, a rule's parts have to be adjacent: no
+  tokens can be skipped over, and results take up no room, so no boosts
+  are needed for rules to see their parts. Instead, no constituent may
+  span more than span tokens; this defaults to the grammar's buffer
+  length. The work per token depends on the grammar and the span, not on
+  the order the rules were written in.
+
+  The grammar may be a single rule or a union of them. Rules have to be
+  built from single-token patterns; policies are ignored, since no
+  constituent is reported twice. A ChartMatcher can't be combined into a
+  union with other matchers; run it on its own.
+
+  >>> from Pattern import word
+  >>> from TokenPattern import token
+  >>> from ResultFilter import ResultFilter
+  >>> det = Matcher("the", "DET")
+  >>> adj = Matcher("big", "ADJ")
+  >>> cn = Matcher("dog", "CN")
+  >>> mod = (token("ADJ") + token("CN")%"cn") >> "CN"
+  >>> np = (token("DET")%"det" + token("CN")%"cn") >> "NP"
+  >>> vp = (token("NP")%"subj" + word("barked")) >> "VP"
+  >>> chart = ChartMatcher(det | adj | cn | mod | np | vp, span = 5)
+  >>> list(ResultFilter(["VP"])(chart("the big big dog barked".split())))
+  [VP{'subj': NP{'det': DET{'token': 'the'}, 'cn': CN{'cn': CN{'cn': CN{'token': 'dog'}}}}}]
+  >>> [t for t in chart("the dog".split())]
+  ['the', DET{'token': 'the'}, 'dog', CN{'token': 'dog'}, NP{'det': DET{'token': 'the'}, 'cn': CN{'token': 'dog'}}]
+  """
+
+  def __init__(self, grammar, span = None, keep_original = None):
+    if span is None:
+      span = grammar._buffer_length
+    if keep_original is None:
+      keep_original = grammar._keep_original
+    super(ChartMatcher, self).__init__(None, None, span, keep_original)
+    self._grammar = grammar
+    self._span = span
+
+    if isinstance(grammar, UnionMatcher):
+      rules = list(grammar._rules())
+    else:
+      rules = [grammar]
+    self._rules = [_rule(m) for m in rules]
+
+    # Index the rules by the anchor of their newest leaf, so that only
+    # rules that could end with a constituent are tried on it
+    index = {}
+    fallback = []
+    for i, (tests, anchor, matcher) in enumerate(self._rules):
+      if anchor is None:
+        fallback.append(i)
+      else:
+        index.setdefault(anchor, []).append(i)
+    self._index = dict((a, sorted(rs + fallback)) for a, rs in index.items())
+    self._fallback = fallback
+
+  def __or__(self, other):
+    raise TypeError("a ChartMatcher can't be combined with other matchers")
+
+  def prune(self, types):
+    """
+    Return a chart matcher running only the rules needed to produce the
+    given types; see UnionMatcher.prune.
+    """
+    return ChartMatcher(self._grammar.prune(types), self._span, self._keep_original)
+
+  def intern(self, vocab):
+    return ChartMatcher(self._grammar.intern(vocab), self._span, self._keep_original)
+
+  def _produces(self):
+    return self._grammar._produces()
+
+  def _patterns(self):
+    return self._grammar._patterns()
+
+  def _anchor(self):
+    return None
+
+  def _new_chart(self):
+    # The constituents ending at each of the last span positions, newest
+    # first, each as a list of (start, value) pairs, the set of the
+    # (start, type) pairs already built and the token at the position
+    return collections.deque(maxlen = self._span)
+
+  def _feed(self, context, tok, out):
+    """
+    Add one token to the chart, appending to out the token if it is kept,
+    then every constituent it completes, shortest derivations first.
+    """
+    chart = context.state(self, self._new_chart)
+    position = context.pushed
+    context.pushed += 1
+    if self._keep_original:
+      out.append(tok)
+
+    edges = [(position, tok)]
+    built = set()
+    chart.appendleft((edges, built, tok))
+    spanned = _span(tok) is not None
+    lowest = position + 1 - self._span
+
+    # The new constituents are the agenda, and all of them end here
+    rules = self._rules
+    index = self._index
+    fallback = self._fallback
+    for start, value in edges:
+      if isinstance(value, MatchResult):
+        key = (MatchResult, value.token_type)
+      else:
+        key = value
+      try:
+        candidates = index.get(key, fallback)
+      except TypeError:
+        # Unhashable tokens can't be anchors
+        candidates = fallback
+
+      for i in candidates:
+        tests, anchor, matcher = rules[i]
+        v = tests[0](value)
+        if v is None:
+          continue
+        for first, values in _chains(chart, tests, 1, start, [v], position, lowest):
+          if (first, matcher._match_type) in built:
+            continue
+          built.add((first, matcher._match_type))
+          result = _build(matcher, values)
+          if spanned:
+            result._span = _covering([chart[position - first][2], tok])
+          out.append(result)
+          edges.append((first, result))
+
+def _rule(matcher):
+  """
+  Return the leaf tests of a rule, newest first, the anchor of its newest
+  leaf and the matcher that builds its results.
+  """
+  if type(matcher) is Matcher:
+    leaves = [Pattern(matcher._pattern)]
+  elif isinstance(matcher, PatternMatcher):
+    leaves = matcher._pattern._leaves()
+  else:
+    raise TypeError("cannot chart matcher of type %s"%type(matcher).__name__)
+  return [_leaf_test(p) for p in leaves], leaves[0]._anchor(), matcher
+
+def _chains(chart, tests, j, start, values, position, lowest):
+  """
+  Yield the start and leaf values, in scan order, of every way of binding
+  the leaves from j onwards to adjacent constituents ending at start.
+  """
+  if j == len(tests):
+    yield start, list(values)
+    return
+  age = position + 1 - start
+  if start <= lowest or age >= len(chart):
+    return
+  test = tests[j]
+  for s, value in chart[age][0]:
+    if s < lowest:
+      continue
+    v = test(value)
+    if v is not None:
+      values.append(v)
+      for found in _chains(chart, tests, j + 1, s, values, position, lowest):
+        yield found
+      values.pop()
+
+def _build(matcher, values):
+  """
+  Build the result of a rule from the values its leaves bound.
+  """
+  if type(matcher) is Matcher:
+    result = MatchResult(matcher._match_type)
+    result["token"] = values[0]
+    return result
+  return matcher._result(_bind(matcher._pattern, iter(values)))
+
+# Doctest magic
+if __name__ == "__main__":
+  import doctest
+  doctest.testmod()
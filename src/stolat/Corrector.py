@@ -7,6 +7,9 @@ normalisation process.
 See http://norvig.com/spell-correct.html for more information.
 """
 import collections
+import threading
+
+from Token import _respan
 
 class Corrector(object):
   """
@@ -14,7 +17,13 @@ class Corrector(object):
   probabilities supplied in the constructor.
   """
 
-  def __init__(self, corpus, smoothing = 1): 
+  # Counts of the lookups made by each path through _correct, when
+  # profiled; see Profile. A Feeder runs _correct on several threads, so
+  # the counts are only touched under the lock
+  _paths = None
+  _paths_lock = threading.Lock()
+
+  def __init__(self, corpus, smoothing = 1, cache_size = 10000): 
     """
     Create a new spelling correction callable object. Pass in a corpus; a
     sequence of words.
@@ -23,18 +32,137 @@ class Corrector(object):
     frequency of any item whether or not it is in the corpus. This defaults
     to 1.
 
+    Corrections are memoised for up to cache_size distinct words; pass 0 to
+    turn the cache off.
+
     >>> Corrector("the dog hit the cat".split())
     Corrector: 4 unique words, alphabet: 9
     """
-    self._corpus = collections.defaultdict(lambda: smoothing)
-    self._alphabet = set()
+    # Count into a plain dict so that the table can be pickled and saved
+    counts = {}
+    get = counts.get
     for w in corpus:
-      self._corpus[w] += 1
-      # Build the alphabet set from the corpus progressively to allow larger corpora
-      self._alphabet = self._alphabet.union(set(c for c in w))    
-
+      counts[w] = get(w, 0) + 1
+    self._build(counts, None, smoothing, cache_size)
     super(Corrector, self).__init__()
 
+  @classmethod
+  def from_chunks(cls, chunks, smoothing = 1, cache_size = 10000, processes = None):
+    """
+    Build a corrector from an iterable of corpus chunks (each a sequence of
+    words), counting the chunks in a pool of worker processes. The result is
+    the same as building from the concatenated chunks.
+
+    >>> Corrector.from_chunks([["the", "dog"], ["hit", "the", "cat"]], processes = 2)
+    Corrector: 4 unique words, alphabet: 9
+    """
+    return cls._from_pool(_count_chunk, chunks, smoothing, cache_size, processes)
+
+  @classmethod
+  def from_files(cls, paths, tokenize = None, smoothing = 1, cache_size = 10000, processes = None):
+    """
+    Build a corrector from a list of text files, counting the files in a
+    pool of worker processes. Each line is split into words with tokenize,
+    which must be a module-level function so that it can be sent to the
+    workers; the default splits on whitespace.
+    """
+    return cls._from_pool(_count_file, [(p, tokenize) for p in paths], smoothing, cache_size, processes)
+
+  @classmethod
+  def _from_pool(cls, count, work, smoothing, cache_size, processes):
+    """
+    Count each item of work in a process pool and merge the partial counts
+    and alphabets into a new corrector.
+    """
+    import multiprocessing
+    from Parallel import bounded_imap
+
+    counts = {}
+    alphabet = set()
+    get = counts.get
+    pool = multiprocessing.Pool(processes)
+    try:
+      workers = processes or multiprocessing.cpu_count()
+      for partial, letters in bounded_imap(pool, count, work, 2 * workers):
+        for w, n in partial.iteritems():
+          counts[w] = get(w, 0) + n
+        alphabet |= letters
+    finally:
+      pool.terminate()
+
+    cor = cls.__new__(cls)
+    cor._build(counts, alphabet, smoothing, cache_size)
+    return cor
+
+  def _build(self, counts, alphabet, smoothing, cache_size):
+    """
+    Compile a model from raw word frequencies. The alphabet only needs the
+    distinct words, so unless it is supplied it is collected once counting
+    is done.
+    """
+    for w in counts:
+      counts[w] += smoothing
+    if alphabet is None:
+      alphabet = set()
+      for w in counts:
+        alphabet.update(w)
+
+    # Index every known word under each string reachable from it by up to
+    # two deletions. Two words within edit distance 2 always share such a
+    # string, so candidates are found by probing the deletions of the
+    # misspelling rather than generating its whole neighbourhood.
+    deletes = collections.defaultdict(list)
+    for w in counts:
+      for d in _deletes(w, 2):
+        deletes[d].append(w)
+
+    self._init_model(counts, alphabet, dict(deletes), smoothing, cache_size)
+
+  @classmethod
+  def load(cls, path, cache_size = 10000):
+    """
+    Load a corrector from a model file written by save. The file is mapped
+    rather than read, so this takes milliseconds whatever the size of the
+    model, and processes loading the same file share its pages.
+
+    >>> import os, tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), "model")
+    >>> Corrector("the dog hit the cat".split()).save(path)
+    >>> cor = Corrector.load(path)
+    >>> cor
+    Corrector: 4 unique words, alphabet: 9
+    >>> list(cor("teh dog hut the cta".split()))
+    ['the', 'dog', 'hit', 'the', 'cat']
+    """
+    from ModelFile import ModelFile
+    model = ModelFile(path)
+    cor = cls.__new__(cls)
+    cor._init_model(model.counts, model.alphabet, model.deletes, model.smoothing, cache_size)
+    return cor
+
+  def save(self, path):
+    """
+    Save the compiled model (word counts, alphabet and candidate index) to
+    the given path in a compact format that load can map into memory.
+    """
+    from ModelFile import save_model
+    save_model(path, self._corpus, self._alphabet, self._deletes, self._smoothing)
+
+  def _init_model(self, counts, alphabet, deletes, smoothing, cache_size):
+    self._corpus = counts
+    self._alphabet = alphabet
+    self._deletes = deletes
+    self._smoothing = smoothing
+
+    # Text is Zipfian, so the same words (and misspellings) come round again
+    # and again. The cache maps words to [correction, referenced] and evicts
+    # with the clock algorithm: a word used since the hand last passed it
+    # gets a second chance, so frequent words stay resident.
+    self._cache_size = cache_size
+    self._cache = {}
+    self._clock = collections.deque()
+    self._hits = self._misses = self._evictions = 0
+
   def __call__(self, gen):
     """
     Takes a generator that yields a sequence of strings and produces a
@@ -45,7 +173,19 @@ class Corrector(object):
     ['the', 'dog', 'hit', 'the', 'cat']
     """
     for tok in gen:
-      yield self._correct(tok)
+      yield self._correct_token(tok)
+
+  def _correct_token(self, tok):
+    """
+    Correct one token, keeping the source offsets of a Token.
+
+    >>> from Token import Token
+    >>> cor = Corrector("the dog hit the cat".split())
+    >>> t = cor._correct_token(Token("teh", 4, 7))
+    >>> t, t.span
+    ('the', (4, 7))
+    """
+    return _respan(self._cached_correct(tok), tok)
 
   def __repr__(self):
     """
@@ -53,11 +193,84 @@ class Corrector(object):
     """
     return "Corrector: %d unique words, alphabet: %d"%(len(self._corpus), len(self._alphabet))
 
+  def cache_info(self):
+    """
+    Return the cache's hit, miss and eviction counters along with its
+    current size and capacity.
+
+    >>> cor = Corrector("the dog hit the cat".split(), cache_size = 2)
+    >>> list(cor("teh dog teh cat teh".split()))
+    ['the', 'dog', 'the', 'cat', 'the']
+    >>> sorted(cor.cache_info().items())
+    [('capacity', 2), ('evictions', 1), ('hits', 2), ('misses', 3), ('size', 2)]
+    """
+    return {
+      'hits': self._hits,
+      'misses': self._misses,
+      'evictions': self._evictions,
+      'size': len(self._cache),
+      'capacity': self._cache_size,
+    }
+
+  def _cached_correct(self, word):
+    """
+    Return the correction for the given word, consulting the cache first.
+    """
+    entry = self._cache.get(word)
+    if entry is not None:
+      self._hits += 1
+      entry[1] = True
+      return entry[0]
+
+    self._misses += 1
+    correction = self._correct(word)
+    self._remember(word, correction)
+    return correction
+
+  def _remember(self, word, correction):
+    """
+    Add a correction to the cache, evicting as needed.
+    """
+    if self._cache_size > 0:
+      cache = self._cache
+      clock = self._clock
+      while len(cache) >= self._cache_size:
+        victim = clock.popleft()
+        ventry = cache.get(victim)
+        if ventry is not None and ventry[1]:
+          ventry[1] = False
+          clock.append(victim)
+        else:
+          cache.pop(victim, None)
+          self._evictions += 1
+      cache[word] = [correction, False]
+      clock.append(word)
+
+  def _is_cheap(self, word):
+    """
+    Return whether correcting the word needs no search: it is cached or
+    known.
+    """
+    return word in self._cache or word in self._corpus
+
   def _correct(self, word):
     """
     Return the most likely correction for the given word.
+
+    >>> cor = Corrector("the dog hit the cat".split())
+    >>> cor._correct("teh"), cor._correct("hti"), cor._correct("xyzzy")
+    ('the', 'hit', 'xyzzy')
     """
-    candidates = self._known([word]) or self._known(self._edits1(word)) or self._known_edits(word) or [word]
+    path, candidates = 'known', self._known([word])
+    if not candidates:
+      path, candidates = 'edit1', self._known_within(word, 1)
+    if not candidates:
+      path, candidates = 'edit2', self._known_within(word, 2)
+    if not candidates:
+      path, candidates = 'fallback', [word]
+    if self._paths is not None:
+      with self._paths_lock:
+        self._paths[path] += 1
     return max(candidates, key=self._corpus.get)
 
   def _known(self, words):
@@ -66,22 +279,106 @@ class Corrector(object):
     """
     return set(w for w in words if w in self._corpus)
 
-  def _known_edits(self, word):
+  def _known_within(self, word, distance):
     """
-    Return the set of known words out of all words within edit distance 2 of the provided word.
-    """
-    return set(e2 for e1 in self._edits1(word) for e2 in self._edits1(e1) if e2 in self._corpus)
+    Return the set of known words within the given edit distance of the
+    provided word, counting deletions, insertions, substitutions and
+    transpositions of adjacent letters as one edit each.
 
-  def _edits1(self, word):
-    """
-    Return the set of words within edit distance 1 of the provided word.
+    >>> cor = Corrector("the dog hit the cat".split())
+    >>> sorted(cor._known_within("hte", 1)), sorted(cor._known_within("ct", 2))
+    (['the'], ['cat', 'hit'])
     """
-    splits     = [(word[:i], word[i:]) for i in range(len(word) + 1)]
-    deletes    = [a + b[1:] for a, b in splits if b]
-    transposes = [a + b[1] + b[0] + b[2:] for a, b in splits if len(b)>1]
-    replaces   = [a + c + b[1:] for a, b in splits for c in self._alphabet if b]
-    inserts    = [a + c + b     for a, b in splits for c in self._alphabet]
-    return set(deletes + transposes + replaces + inserts)
+    index = self._deletes
+    candidates = set()
+    for d in _deletes(word, distance):
+      if d in index:
+        candidates.update(index[d])
+    return set(w for w in candidates if _distance(word, w, distance) <= distance)
+
+def _count_chunk(chunk):
+  """
+  Count the words in one chunk of a corpus, returning the counts and the
+  alphabet of the chunk. Runs in a worker process.
+  """
+  counts = {}
+  get = counts.get
+  for w in chunk:
+    counts[w] = get(w, 0) + 1
+  alphabet = set()
+  for w in counts:
+    alphabet.update(w)
+  return counts, alphabet
+
+def _count_file(job):
+  """
+  Count the words in one corpus file, a line at a time. Runs in a worker
+  process.
+  """
+  path, tokenize = job
+  counts = {}
+  get = counts.get
+  f = open(path)
+  try:
+    for line in f:
+      for w in (tokenize(line) if tokenize else line.split()):
+        counts[w] = get(w, 0) + 1
+  finally:
+    f.close()
+  alphabet = set()
+  for w in counts:
+    alphabet.update(w)
+  return counts, alphabet
+
+def _deletes(word, distance):
+  """
+  Return the set of strings reachable from word by up to the given number
+  of deletions, including the word itself.
+
+  >>> sorted(_deletes("cat", 1))
+  ['at', 'ca', 'cat', 'ct']
+  """
+  result = set([word])
+  frontier = result
+  for _ in range(distance):
+    frontier = set(w[:i] + w[i+1:] for w in frontier for i in range(len(w)))
+    result |= frontier
+  return result
+
+def _distance(a, b, limit):
+  """
+  Return the Damerau-Levenshtein distance between two strings, or limit + 1
+  if their lengths alone rule out a distance within the limit.
+  Transpositions may be combined freely with other edits, matching what
+  repeated single edits can reach.
+
+  >>> _distance("ca", "abc", 2), _distance("the", "teh", 2), _distance("a", "bcde", 2)
+  (2, 1, 3)
+  """
+  if abs(len(a) - len(b)) > limit:
+    return limit + 1
+  # Lowrance-Wagner: d is offset by one row and column of sentinels
+  inf = len(a) + len(b)
+  d = [[inf] * (len(b) + 2)]
+  d += [[inf] + range(len(b) + 1)]
+  d += [[inf, i] + [0] * len(b) for i in range(1, len(a) + 1)]
+  last_row = {}
+  for i in range(1, len(a) + 1):
+    last_col = 0
+    for j in range(1, len(b) + 1):
+      k = last_row.get(b[j-1], 0)
+      l = last_col
+      if a[i-1] == b[j-1]:
+        cost = 0
+        last_col = j
+      else:
+        cost = 1
+      d[i+1][j+1] = min(d[i][j] + cost,
+                        d[i+1][j] + 1,
+                        d[i][j+1] + 1,
+                        d[k][l] + (i - k - 1) + 1 + (j - l - 1))
+    last_row[a[i-1]] = i
+  return d[len(a)+1][len(b)+1]
 
 # Doctest magic invocation
 if __name__ == "__main__":
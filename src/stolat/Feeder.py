@@ -0,0 +1,167 @@
+"""
+Feeder.py
+
+A push-mode front end to a Pipeline, for services that receive text a
+piece at a time and can't block while it is matched.
+"""
+import collections
+
+from Token import _respan
+
+class Feeder(object):
+  """
+  Runs one stream through a Pipeline as its tokens are pushed in, rather
+  than pulling them from an iterable. feed() takes the tokens that have
+  arrived and returns whatever output is ready; close() ends the stream
+  and returns the rest. Memory stays bounded by the matchers' windows and
+  by max_pending, however long the stream.
+
+  Correcting a word that is neither cached nor known means searching for
+  words within two edits of it, which can take milliseconds. Given an
+  executor (anything with a submit(fn, *args) method returning a future
+  with done() and result(), such as a concurrent.futures executor), the
+  searches are handed to it. The tokens from the first one still being
+  searched on are held back, in order, and released by poll() once the
+  searches are done. pending() returns the futures being waited on, for
+  an event loop to wait for without blocking. If more than max_pending
+  tokens are held back, feed() waits for the oldest searches.
+
+  A feeder is used from one thread; the executor only ever runs the
+  search itself, which reads the Corrector's tables without changing
+  them.
+
+  >>> from Matcher import Matcher
+  >>> from Corrector import Corrector
+  >>> from Pipeline import Pipeline
+  >>> class Job(object):
+  ...   def __init__(self, fn, args):
+  ...     self.fn, self.args, self.value = fn, args, None
+  ...   def done(self):
+  ...     return self.value is not None
+  ...   def result(self):
+  ...     if self.value is None:
+  ...       self.value = self.fn(*self.args)
+  ...     return self.value
+  >>> class Later(object):
+  ...   def submit(self, fn, *args):
+  ...     return Job(fn, args)
+  >>> cor = Corrector("the dog barked".split())
+  >>> feeder = Pipeline(Matcher("dog", "N"), corrector = cor).feeder(Later())
+  >>> feeder.feed(["the", "dgo"])
+  ['the']
+  >>> feeder.feed(["barked"])
+  []
+  >>> [f.result() for f in feeder.pending()]
+  ['dog']
+  >>> feeder.poll()
+  ['dog', N{'token': 'dog'}, 'barked']
+  >>> feeder.close()
+  []
+  """
+
+  def __init__(self, pipeline, executor = None, max_pending = 1024):
+    self._pipeline = pipeline
+    self._stages = pipeline._stages()
+    self._corrector = pipeline._corrector
+    self._executor = executor if pipeline._corrector is not None else None
+    self._max_pending = max_pending
+    # Tokens waiting to be corrected, in order, each with the future of
+    # its search if it needed one
+    self._held = collections.deque()
+    self._searches = {}
+    self._ready = []
+    self._closed = False
+    super(Feeder, self).__init__()
+
+  def feed(self, tokens):
+    """
+    Push tokens into the stream, returning the output that is ready.
+
+    >>> from Pipeline import Pipeline
+    >>> from Matcher import Matcher
+    >>> feeder = Pipeline(Matcher("dog", "N")).feeder()
+    >>> feeder.feed(["the"]), feeder.feed(["dog"]), feeder.close()
+    (['the'], ['dog', N{'token': 'dog'}], [])
+    """
+    if self._closed:
+      raise ValueError("feed on a closed stream")
+    cor = self._corrector
+    if self._executor is None:
+      chunk = list(tokens)
+      if cor is not None:
+        chunk = [cor._correct_token(tok) for tok in chunk]
+      self._ready.extend(self._pipeline._advance(self._stages, chunk))
+      return self._take()
+
+    held = self._held
+    searches = self._searches
+    for tok in tokens:
+      future = None
+      if not cor._is_cheap(tok):
+        future = searches.get(tok)
+        if future is None:
+          future = searches[tok] = self._executor.submit(cor._correct, tok)
+      held.append((tok, future))
+      if len(held) > self._max_pending:
+        self._release(self._max_pending)
+    self._release(self._max_pending)
+    return self._take()
+
+  def poll(self):
+    """
+    Return the output released by searches finished since the last call.
+    """
+    self._release(self._max_pending)
+    return self._take()
+
+  def pending(self):
+    """
+    Return the futures of the searches the held back tokens are waiting
+    on.
+    """
+    return self._searches.values()
+
+  def close(self):
+    """
+    End the stream, waiting for any searches, and return the rest of the
+    output, including any matches held back by a policy.
+    """
+    if not self._closed:
+      self._release(0)
+      self._ready.extend(self._pipeline._finish(self._stages))
+      self._closed = True
+    return self._take()
+
+  def _release(self, limit):
+    """
+    Correct and match the held tokens up to the first whose search isn't
+    done, waiting for searches while more than limit tokens are held.
+    """
+    held = self._held
+    cor = self._corrector
+    chunk = []
+    while held:
+      tok, future = held[0]
+      if future is None:
+        chunk.append(cor._correct_token(tok))
+      elif future.done() or len(held) > limit:
+        correction = future.result()
+        if self._searches.pop(tok, None) is not None:
+          cor._misses += 1
+          cor._remember(tok, correction)
+        chunk.append(_respan(correction, tok))
+      else:
+        break
+      held.popleft()
+    if chunk:
+      self._ready.extend(self._pipeline._advance(self._stages, chunk))
+
+  def _take(self):
+    ready = self._ready
+    self._ready = []
+    return ready
+
+# Doctest magic
+if __name__ == "__main__":
+  import doctest
+  doctest.testmod()
@@ -0,0 +1,135 @@
+"""
+FuzzyPattern.py
+
+Implements a pattern that matches a word, allowing for a few typing
+mistakes.
+"""
+
+import copy
+from itertools import islice
+
+from Pattern import Pattern
+from MatchResult import MatchResult
+from TokenCache import TokenCache
+
+# The verdicts of the last FuzzySet to walk each token text, as the bits
+# of its members by (word, max_edits) and the bitmask it found; see
+# FuzzySet.verdict
+_walked = TokenCache()
+
+class FuzzyPattern(Pattern):
+  """
+  A pattern that matches any token within max_edits of the given word,
+  counting each character inserted, deleted or substituted as one edit
+  (the Levenshtein distance). It binds the token as written, so a rule
+  can tolerate the odd misspelt keyword without running the whole stream
+  through a Corrector.
+
+  >>> buf = "the febuary sales".split()
+  >>> buf.reverse()
+  >>> FuzzyPattern("february", 2).scan(buf)
+  ('febuary', 2)
+  >>> (FuzzyPattern("february", 1)%"month" + Pattern("sales")).matches(buf)
+  ({'month': 'febuary'}, ['the'])
+  >>> FuzzyPattern("february", 1).scan(["feb"])
+  (None, 1)
+  """
+
+  def __init__(self, pattern, max_edits = 1, field = None):
+    self.max_edits = max_edits
+
+    # The pattern remembers its verdicts
+    self._verdicts = TokenCache()
+    # Set on interned copies, whose tokens are ids to be looked up
+    self._vocab = None
+    super(FuzzyPattern, self).__init__(pattern, field)
+
+  def scan(self, buf, start = 0, bound = None):
+    """
+    Search for a token in the buffer near enough to the word.
+
+    >>> FuzzyPattern("dog").scan(["dgo", "dig", "cat"])
+    ('dig', 2)
+    """
+    for i, t in enumerate(islice(buf, start, None), start):
+      if self._match_token(t) is not None:
+        if bound is not None:
+          bound.append(i)
+        return t, i + 1
+    return None, len(buf)
+
+  def _anchor(self):
+    return None
+
+  def _match_token(self, tok):
+    """
+    Test a single token, returning it if it is near enough to the word
+    and None otherwise. A token a FuzzySet holding this word has just
+    walked isn't compared again; the set's verdict is taken.
+
+    >>> p = FuzzyPattern("march")
+    >>> p._match_token("mrach"), p._match_token("marc"), p._match_token(MatchResult("X"))
+    (None, 'marc', None)
+    """
+    if isinstance(tok, MatchResult):
+      return None
+    text = str(tok) if self._vocab is None else self._vocab.string(tok)
+    v = self._verdicts.get(text)
+    if v is None:
+      walked = _walked.get(text)
+      bit = walked and walked[0].get((self.pattern, self.max_edits))
+      if bit:
+        v = bool(walked[1] & bit)
+      else:
+        v = _distance(self.pattern, text, self.max_edits) is not None
+      self._verdicts.put(text, v)
+    if v:
+      return tok
+    return None
+
+  def intern(self, vocab):
+    """
+    Return a copy of this pattern that looks up the text of token ids in
+    the given Vocabulary before comparing them with the word.
+
+    >>> from Vocabulary import Vocabulary
+    >>> FuzzyPattern("dog").intern(Vocabulary(["a", "dgo", "dig"])).scan([0, 1, 2])
+    (2, 3)
+    """
+    p = copy.copy(self)
+    p._vocab = vocab
+    return p
+
+fuzzy_word = FuzzyPattern
+
+def _distance(a, b, limit):
+  """
+  Return the Levenshtein distance between two strings if it is at most
+  limit, or None. Rows of the table are abandoned as soon as every entry
+  is over the limit.
+
+  >>> _distance("february", "febuary", 2), _distance("february", "feb", 2)
+  (1, None)
+  >>> _distance("kitten", "sitting", 3), _distance("kitten", "sitting", 2)
+  (3, None)
+  """
+  if abs(len(a) - len(b)) > limit:
+    return None
+  if a == b:
+    return 0
+  previous = range(len(b) + 1)
+  for i, ca in enumerate(a, 1):
+    current = [i]
+    for j, cb in enumerate(b, 1):
+      current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+    if min(current) > limit:
+      return None
+    previous = current
+  if previous[-1] > limit:
+    return None
+  return previous[-1]
+
+# Doctest magic
+if __name__ == "__main__":
+  import doctest
+  doctest.testmod()
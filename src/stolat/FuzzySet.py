@@ -0,0 +1,110 @@
+"""
+FuzzySet.py
+
+Tests a token against many fuzzy words at once by walking a trie of them.
+"""
+from TokenCache import TokenCache
+from FuzzyPattern import _walked
+
+class FuzzySet(object):
+  """
+  A set of FuzzyPatterns that are tested together. Their words are put in
+  a trie, and a token is compared with all of them in one walk: each node
+  extends the edit distance table of its parent by one row, so words
+  sharing a prefix share its rows, and a branch is abandoned as soon as
+  its row is further from the token than any word below it allows.
+
+  As with a RegexpSet, the members are left alone: a UnionMatcher asks the
+  set which of them are near the tokens in the window, to pick the rules
+  worth running. Verdicts are cached per token text, and each new one is
+  also left where any pattern for one of the words can find it, so that
+  the rules picked don't compare the tokens again.
+
+  >>> from FuzzyPattern import fuzzy_word
+  >>> jan, feb, march = fuzzy_word("january", 2), fuzzy_word("february", 2), fuzzy_word("march")
+  >>> fs = FuzzySet([jan, feb, march])
+  >>> fs.verdict("janury"), fs.verdict("febuary"), fs.verdict("mach"), fs.verdict("may")
+  (1, 2, 4, 0)
+  >>> fs.bit(march), fs.bit(fuzzy_word("march"))
+  (4, 0)
+
+  >>> import FuzzyPattern
+  >>> distance, FuzzyPattern._distance = FuzzyPattern._distance, None
+  >>> fs.verdict("mrch"), march._match_token("mrch")
+  (4, 'mrch')
+  >>> fuzzy_word("march")._match_token("mrch")
+  'mrch'
+  >>> FuzzyPattern._distance = distance
+  """
+
+  def __init__(self, patterns, cache_size = 4096):
+    self._patterns = []
+    for p in patterns:
+      if not any(p is q for q in self._patterns):
+        self._patterns.append(p)
+
+    # Each node is [children by character, (edits, bit) of the words
+    # ending here, the most edits allowed to any word below]
+    self._root = [{}, [], 0]
+    # The bit of each word, as patterns look for it in the verdicts
+    self._bits = {}
+    for j, p in enumerate(self._patterns):
+      self._bits.setdefault((p.pattern, p.max_edits), 1 << j)
+      node = self._root
+      node[2] = max(node[2], p.max_edits)
+      for c in p.pattern:
+        node = node[0].setdefault(c, [{}, [], 0])
+        node[2] = max(node[2], p.max_edits)
+      node[1].append((p.max_edits, 1 << j))
+
+    self._cache = TokenCache(cache_size)
+    super(FuzzySet, self).__init__()
+
+  def bit(self, pattern):
+    """
+    Return the bit standing for the given member in the verdicts, or 0 if
+    it isn't one.
+    """
+    for j, p in enumerate(self._patterns):
+      if p is pattern:
+        return 1 << j
+    return 0
+
+  def verdict(self, text):
+    """
+    Return a bitmask of the members near enough to the given token text,
+    bit j being set when member j is.
+    """
+    v = self._cache.get(text)
+    if v is None:
+      v = self._scan(text)
+      self._cache.put(text, v)
+      _walked.put(text, (self._bits, v))
+    return v
+
+  def _scan(self, text):
+    mask = 0
+    root = self._root
+    columns = range(1, len(text) + 1)
+    stack = [(root, range(len(text) + 1))]
+    while stack:
+      node, previous = stack.pop()
+      for c, child in node[0].iteritems():
+        current = [previous[0] + 1]
+        for j in columns:
+          current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (text[j - 1] != c)))
+        for edits, bit in child[1]:
+          if current[-1] <= edits:
+            mask |= bit
+        if min(current) <= child[2]:
+          stack.append((child, current))
+    # The empty word is the root's
+    for edits, bit in root[1]:
+      if len(text) <= edits:
+        mask |= bit
+    return mask
+
+# Doctest magic
+if __name__ == "__main__":
+  import doctest
+  doctest.testmod()
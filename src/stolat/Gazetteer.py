@@ -0,0 +1,219 @@
+"""
+Gazetteer.py
+
+A dictionary of multi-word phrases, each filed under a category, compiled
+into a token-level Aho-Corasick automaton. Feeding the automaton one token
+at a time finds every phrase ending at that token in a single pass over the
+stream, however many phrases the dictionary holds.
+"""
+import array
+import marshal
+
+MAGIC = 'STOLATG1'
+
+class Gazetteer(object):
+  """
+  A phrase dictionary compiled into an Aho-Corasick automaton over tokens.
+
+  States are numbered, with 0 the root. Transitions are kept in one flat
+  dict keyed by (state, token), which costs far less than a dict per state
+  when most states have a single successor. Each state also has a failure
+  link (the state for the longest proper suffix of its path that is also a
+  path) and an output link (the nearest state along the failure links that
+  ends a phrase), so the phrases ending at a state are its own plus those
+  along its output links.
+
+  >>> g = Gazetteer([("new york", "CITY"), ("york", "CITY"), ("new york times", "PAPER")])
+  >>> g
+  Gazetteer: 3 phrases, 2 categories
+  >>> s = 0
+  >>> for tok in "the new york times".split():
+  ...   s = g.step(s, tok)
+  ...   print tok, g.outputs(s)
+  the []
+  new []
+  york [(2, 'new york', 'CITY'), (1, 'york', 'CITY')]
+  times [(3, 'new york times', 'PAPER')]
+  """
+
+  def __init__(self, entries):
+    """
+    Build a gazetteer from a sequence of (phrase, category) pairs. A phrase
+    is either a string, which is split on whitespace, or a sequence of
+    tokens. A phrase may be filed under several categories.
+    """
+    edges = {}
+    children = [[]]
+    out = {}
+    categories = set()
+    count = 0
+    longest = 0
+    for phrase, category in entries:
+      if isinstance(phrase, basestring):
+        phrase = phrase.split()
+      if not phrase:
+        continue
+      node = 0
+      for tok in phrase:
+        child = edges.get((node, tok))
+        if child is None:
+          child = edges[(node, tok)] = len(children)
+          children[node].append((tok, child))
+          children.append([])
+        node = child
+      entry = (len(phrase), ' '.join(phrase), category)
+      if entry not in out.get(node, ()):
+        out[node] = out.get(node, ()) + (entry,)
+        count += 1
+      categories.add(category)
+      longest = max(longest, len(phrase))
+
+    # Breadth first, so every state's failure link is set before its
+    # children need it
+    fail = array.array('i', [0]) * len(children)
+    link = array.array('i', [0]) * len(children)
+    queue = [child for tok, child in children[0]]
+    for node in queue:
+      for tok, child in children[node]:
+        f = fail[node]
+        while f and (f, tok) not in edges:
+          f = fail[f]
+        f = edges.get((f, tok), 0)
+        fail[child] = f
+        link[child] = f if f in out else link[f]
+        queue.append(child)
+
+    self._init_automaton(edges, fail, link, out, len(categories), count, longest)
+    super(Gazetteer, self).__init__()
+
+  def _init_automaton(self, edges, fail, link, out, categories, count, longest):
+    self._edges = edges
+    self._fail = fail
+    self._link = link
+    self._out = out
+    self._categories = categories
+    self._count = count
+    self.longest = longest
+
+  @classmethod
+  def from_file(cls, path, tokenize = None):
+    """
+    Build a gazetteer from a text file with one "category<TAB>phrase" entry
+    per line. Phrases are split into tokens with tokenize, which defaults
+    to splitting on whitespace. Blank lines are skipped.
+    """
+    def entries():
+      f = open(path)
+      try:
+        for line in f:
+          line = line.rstrip('\r\n')
+          if not line.strip():
+            continue
+          category, phrase = line.split('\t', 1)
+          yield (tokenize(phrase) if tokenize else phrase.split()), category
+      finally:
+        f.close()
+    return cls(entries())
+
+  @classmethod
+  def load(cls, path):
+    """
+    Load a gazetteer saved with save. The automaton is stored ready built,
+    so loading costs no more than reading the file.
+
+    >>> import os, tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), "places")
+    >>> Gazetteer([("new york", "CITY"), ("york", "CITY")]).save(path)
+    >>> g = Gazetteer.load(path)
+    >>> g, g.outputs(g.step(g.step(0, "new"), "york"))
+    (Gazetteer: 2 phrases, 1 categories, [(2, 'new york', 'CITY'), (1, 'york', 'CITY')])
+    """
+    f = open(path, 'rb')
+    try:
+      data = marshal.load(f)
+    finally:
+      f.close()
+    if not isinstance(data, tuple) or data[0] != MAGIC:
+      raise ValueError("%s is not a stolat gazetteer file"%path)
+    magic, edges, fail, link, out, categories, count, longest = data
+    g = cls.__new__(cls)
+    g._init_automaton(edges, array.array('i', fail), array.array('i', link), out, categories, count, longest)
+    return g
+
+  def save(self, path):
+    """
+    Save the compiled automaton to the given path in marshal format.
+    """
+    f = open(path, 'wb')
+    try:
+      marshal.dump((MAGIC, self._edges, self._fail.tolist(), self._link.tolist(),
+                    self._out, self._categories, self._count, self.longest), f)
+    finally:
+      f.close()
+
+  def __len__(self):
+    return self._count
+
+  def __repr__(self):
+    return "Gazetteer: %d phrases, %d categories"%(self._count, self._categories)
+
+  def categories(self):
+    """
+    Return the set of categories the phrases are filed under.
+
+    >>> sorted(Gazetteer([("paris", "CITY"), ("france", "COUNTRY")]).categories())
+    ['CITY', 'COUNTRY']
+    """
+    return set(e[2] for entries in self._out.itervalues() for e in entries)
+
+  def intern(self, vocab):
+    """
+    Return a copy of this gazetteer whose transitions read token ids from
+    the given Vocabulary. The phrases it reports are still strings.
+
+    >>> from Vocabulary import Vocabulary
+    >>> v = Vocabulary()
+    >>> g = Gazetteer([("new york", "CITY")]).intern(v)
+    >>> g.outputs(g.step(g.step(0, v.intern("new")), v.intern("york")))
+    [(2, 'new york', 'CITY')]
+    """
+    g = Gazetteer.__new__(Gazetteer)
+    edges = dict(((s, vocab.intern(t) if isinstance(t, basestring) else t), c)
+                 for (s, t), c in self._edges.iteritems())
+    g._init_automaton(edges, self._fail, self._link, self._out, self._categories, self._count, self.longest)
+    return g
+
+  def step(self, state, tok):
+    """
+    Return the state reached from the given state by reading tok.
+    """
+    edges = self._edges
+    try:
+      while True:
+        child = edges.get((state, tok))
+        if child is not None:
+          return child
+        if state == 0:
+          return 0
+        state = self._fail[state]
+    except TypeError:
+      # Unhashable tokens can't be part of any phrase
+      return 0
+
+  def outputs(self, state):
+    """
+    Return the (length, phrase, category) entries of every phrase ending at
+    the given state, longest first.
+    """
+    found = []
+    if state not in self._out:
+      state = self._link[state]
+    while state:
+      found.extend(self._out[state])
+      state = self._link[state]
+    return found
+
+# Doctest magic
+if __name__ == "__main__":
+  import doctest
+  doctest.testmod()
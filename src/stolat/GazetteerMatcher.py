@@ -0,0 +1,98 @@
+"""
+GazetteerMatcher.py
+
+A matcher that streams tokens through a Gazetteer's automaton, emitting a
+result for every phrase it finds.
+"""
+
+import collections
+
+from Matcher import Matcher
+from MatchResult import MatchResult
+from GazetteerPattern import _result
+from Token import _span, _covering
+
+class GazetteerMatcher(Matcher):
+  """
+  Runs a GazetteerPattern's automaton over the stream, advancing one state
+  per token, so the cost per token does not depend on the number of
+  phrases. The current state is kept in the context. Results pushed into
+  the window by this or other matchers are skipped, so they don't break up
+  a phrase.
+
+  Every phrase ending at a token is reported, longest first. Results are
+  typed by the phrase's category unless a type is given, in which case the
+  category becomes a field.
+
+  >>> from GazetteerPattern import gazetteer
+  >>> from Pattern import word
+  >>> from TokenPattern import token
+  >>> places = gazetteer([("new york", "CITY"), ("united states", "COUNTRY")])
+  >>> m = (places >> "PLACE") | ((word("in") + token("PLACE")%"where") >> "LOC") ^ 2
+  >>> list(m("born in new york".split()))
+  ['born', 'in', 'new', 'york', PLACE{'category': 'CITY', 'phrase': 'new york'}, LOC{'where': PLACE{'category': 'CITY', 'phrase': 'new york'}}]
+  """
+
+  def __init__(self, pattern, type_name = None, keep_original = True):
+    super(GazetteerMatcher, self).__init__(pattern, type_name, len(pattern), keep_original)
+    self._match_type = type_name
+
+  def _anchor(self):
+    # The automaton has to see every token to keep its state current
+    return None
+
+  def _patterns(self):
+    return []
+
+  def _produces(self):
+    if self._match_type is not None:
+      return set([self._match_type])
+    return self._pattern.gazetteer.categories()
+
+  def intern(self, vocab):
+    m = GazetteerMatcher(self._pattern.intern(vocab), self._match_type, self._keep_original)
+    m = m._with_policy(self._dedupe, self._overlap, self._selection)
+    return m ^ (self._buffer_length - m._buffer_length)
+
+  def _match(self, buf, context):
+    tok = buf[0]
+    policy = self._dedupe or self._overlap
+    if isinstance(tok, MatchResult):
+      return self._select(buf, context, []) if policy else []
+    state = context.state(self, self._new_state)
+    g = self._pattern.gazetteer
+    state[0] = g.step(state[0], tok)
+    found = [_result(entry, self._match_type or entry[2]) for entry in g.outputs(state[0])]
+    if found and _span(tok) is not None:
+      for entry, r in zip(g.outputs(state[0]), found):
+        r._span = _covering(_phrase(buf, entry[0]))
+    if not policy:
+      return found
+
+    # Policies need the positions of the phrase's tokens
+    recent = state[1]
+    recent.append(context.pushed - 1)
+    matches = [(list(recent)[-entry[0]:], r) for entry, r in zip(g.outputs(state[0]), found)]
+    return self._select(buf, context, matches)
+
+  def _new_state(self):
+    # The automaton's state and the positions of the latest text tokens
+    return [0, collections.deque(maxlen = self._pattern.gazetteer.longest)]
+
+def _phrase(buf, length):
+  """
+  Return the newest tokens of the window that are not results, up to the
+  given number.
+  """
+  toks = []
+  for t in buf:
+    if not isinstance(t, MatchResult):
+      toks.append(t)
+      if len(toks) == length:
+        break
+  return toks
+
+# Doctest magic
+if __name__ == "__main__":
+  import doctest
+  doctest.testmod()
@@ -0,0 +1,121 @@
+"""
+GazetteerPattern.py
+
+Implements a pattern that matches any phrase from a Gazetteer.
+"""
+import copy
+from itertools import islice
+
+from Pattern import Pattern
+from MatchResult import MatchResult
+from Gazetteer import Gazetteer
+from Token import _covering
+
+class GazetteerPattern(Pattern):
+  """
+  A pattern that matches a run of tokens forming one of the phrases of a
+  gazetteer, binding a MatchResult typed by the phrase's category. Results
+  and other MatchResults in the window are skipped over, so phrases still
+  match when other rules have fired part way through them.
+
+  Pass a Gazetteer, or a sequence of (phrase, category) pairs to build one.
+
+  >>> from Pattern import word
+  >>> places = GazetteerPattern([("new york", "CITY"), ("paris", "CITY")])
+  >>> buf = "we flew to new york today".split()
+  >>> buf.reverse()
+  >>> places.scan(buf)
+  (CITY{'phrase': 'new york'}, 3)
+  >>> (word("to") + places % "place").matches(buf)
+  ({'place': CITY{'phrase': 'new york'}}, ['flew', 'we'])
+  """
+
+  def __init__(self, gazetteer, field = None):
+    if not isinstance(gazetteer, Gazetteer):
+      gazetteer = Gazetteer(gazetteer)
+    self.gazetteer = gazetteer
+    super(GazetteerPattern, self).__init__(field = field)
+
+  def scan(self, buf, start = 0, bound = None):
+    """
+    Search for the newest phrase in the buffer at or after the given
+    offset. The automaton reads the tokens oldest first, as they arrived;
+    where several phrases end at the same token the longest wins.
+
+    >>> g = GazetteerPattern([("york", "CITY"), ("new york", "CITY")])
+    >>> g.scan(["york", MatchResult("X"), "new", "in"])
+    (CITY{'phrase': 'new york'}, 3)
+    >>> g.scan(["york", "new", "in"], 1)
+    (None, 3)
+    """
+    positions = []
+    for i, t in enumerate(islice(buf, start, None), start):
+      if not isinstance(t, MatchResult):
+        positions.append(i)
+    positions.reverse()
+
+    g = self.gazetteer
+    state = 0
+    best = None
+    for k, i in enumerate(positions):
+      state = g.step(state, buf[i])
+      found = g.outputs(state)
+      if found:
+        best = k, found[0]
+    if best is None:
+      return None, len(buf)
+    k, entry = best
+    if bound is not None:
+      bound.extend(positions[k - entry[0] + 1:k + 1])
+    result = _result(entry, entry[2])
+    result._span = _covering([buf[i] for i in positions[k - entry[0] + 1:k + 1]])
+    return result, positions[k - entry[0] + 1] + 1
+
+  def _anchor(self):
+    return None
+
+  def intern(self, vocab):
+    p = copy.copy(self)
+    p.gazetteer = self.gazetteer.intern(vocab)
+    return p
+
+  def __len__(self):
+    """
+    The buffer needs to hold the longest phrase.
+
+    >>> len(GazetteerPattern([("new york", "CITY"), ("paris", "CITY")]))
+    2
+    """
+    return self.gazetteer.longest
+
+  def __rshift__(self, other):
+    """
+    Turn this pattern into a GazetteerMatcher, which runs the automaton
+    over the stream once rather than rescanning the window per token. Pass
+    None to type the results by category.
+
+    >>> m = GazetteerPattern([("new york", "CITY"), ("york", "CITY")]) >> None
+    >>> list(m("new york".split()))
+    ['new', 'york', CITY{'phrase': 'new york'}, CITY{'phrase': 'york'}]
+    """
+    from GazetteerMatcher import GazetteerMatcher
+    return GazetteerMatcher(self, other)
+
+def _result(entry, type_name):
+  """
+  Build the MatchResult for a gazetteer entry. The category is recorded as
+  a field when it is not the result's type.
+  """
+  length, phrase, category = entry
+  r = MatchResult(type_name)
+  r['phrase'] = phrase
+  if type_name != category:
+    r['category'] = category
+  return r
+
+gazetteer = GazetteerPattern
+
+# Doctest magic
+if __name__ == "__main__":
+  import doctest
+  doctest.testmod()
@@ -0,0 +1,44 @@
+"""
+MatchContext.py
+
+The per-stream state of a running matcher. Matchers themselves are
+immutable grammar definitions; everything that changes as tokens arrive
+lives in a context created afresh by each call.
+"""
+from Window import Window
+
+class MatchContext(object):
+  """
+  Holds the sliding window for one stream, plus any private state that
+  individual matchers keep between tokens.
+
+  >>> ctx = MatchContext(2)
+  >>> ctx.window.maxlen
+  2
+  >>> s = ctx.state("m", list)
+  >>> s.append(1)
+  >>> ctx.state("m", list)
+  [1]
+  """
+
+  def __init__(self, buffer_length):
+    self.window = Window(maxlen=buffer_length)
+    # The number of tokens pushed so far, which numbers stream positions
+    self.pushed = 0
+    self._states = {}
+
+  def state(self, matcher, factory):
+    """
+    Return the given matcher's state for this stream, creating it with
+    factory the first time it is asked for.
+    """
+    try:
+      return self._states[matcher]
+    except KeyError:
+      state = self._states[matcher] = factory()
+      return state
+
+# Doctest magic
+if __name__ == "__main__":
+  import doctest
+  doctest.testmod()
@@ -1,20 +1,70 @@
 """
 MatchResult.py
 
-A dictionary subclass that adds some extra fields relevant to matches.
+A compact mapping that holds the fields bound by a match, along with the
+type of the match.
 """
+import collections
 
-class MatchResult(dict):
+# Field name tuples, shared between all the results that bind the same
+# fields in the same order. A grammar has few shapes of result; past the
+# limit, new shapes go unshared rather than growing the table for ever
+_FIELDS = {(): ()}
+_MAX_SHAPES = 4096
+
+class MatchResult(object):
   """
   A dictionary-like object that holds information relevant to matches.
+
+  Results are the bulk of a matcher's output, so they are kept small: the
+  field names live in a tuple shared by every result of the same shape and
+  the values in a tuple alongside it, with no per-instance dict. The usual
+  mapping methods are provided directly, and results are registered as a
+  MutableMapping, but they are not dicts: isinstance(r, dict) is false, and
+  json needs telling how to encode them, with default = MatchResult.to_dict.
+
+  A result matched from Tokens records the span of source bytes covered
+  by the tokens it bound, as (start, end); otherwise its span is None.
+
+  >>> mr = MatchResult("NP")
+  >>> mr["det"] = "the"
+  >>> mr["cn"] = "dog"
+  >>> mr["cn"], len(mr), "det" in mr, mr.get("adj")
+  ('dog', 2, True, None)
+  >>> mr2 = MatchResult("NP")
+  >>> mr2.update([("det", "a"), ("cn", "cat")])
+  >>> mr2._fields is mr._fields
+  True
+  >>> isinstance(mr, collections.Mapping), isinstance(mr, dict)
+  (True, False)
+
+  Every method of a MutableMapping is there, and behaves as a dict's:
+  >>> [m for m in dir(collections.MutableMapping)
+  ...  if not m.startswith("_") and not hasattr(MatchResult, m)]
+  []
+  >>> mr.setdefault("adj", "big"), mr.setdefault("det", "a"), mr.pop("adj")
+  ('big', 'the', 'big')
+  >>> mr.popitem(), mr.popitem(), mr
+  (('cn', 'dog'), ('det', 'the'), NP{})
+  >>> mr.popitem()
+  Traceback (most recent call last):
+    ...
+  KeyError: 'popitem(): dictionary is empty'
   """
 
+  __slots__ = ('_token_type', '_fields', '_values', '_span')
+
+  # Mutable, so unhashable, as when this was a dict
+  __hash__ = None
+
   def __init__(self, token_type):
     """
-    Create a new MatchResult. 
+    Create a new MatchResult.
     """
     self._token_type = token_type
-    super(MatchResult, self).__init__()
+    self._fields = ()
+    self._values = ()
+    self._span = None
 
   def _get_token_type(self):
     return self._token_type
@@ -25,6 +75,10 @@ class MatchResult(dict):
 
   token_type = property(_get_token_type, _set_token_type)
 
+  @property
+  def span(self):
+    return self._span
+
   def __repr__(self):
     """
     Return a meaningful representation of this match result.
@@ -34,7 +88,165 @@ class MatchResult(dict):
     >>> mr
     date{'year': 2010}
     """
-    return "%s%s"%(self.token_type, super(MatchResult, self).__repr__())
+    return "%s%r"%(self.token_type, dict(zip(self._fields, self._values)))
+
+  def __reduce__(self):
+    return (_restore, (self._token_type, self._fields, self._values,
+                       self._span))
+
+  def __len__(self):
+    return len(self._fields)
+
+  def __contains__(self, key):
+    return key in self._fields
+
+  has_key = __contains__
+
+  def __iter__(self):
+    return iter(self._fields)
+
+  iterkeys = __iter__
+
+  def __getitem__(self, key):
+    try:
+      return self._values[self._fields.index(key)]
+    except ValueError:
+      raise KeyError(key)
+
+  def __setitem__(self, key, value):
+    fields = self._fields
+    if key in fields:
+      i = fields.index(key)
+      self._values = self._values[:i] + (value,) + self._values[i+1:]
+    else:
+      self._fields = _shared(fields + (key,))
+      self._values += (value,)
+
+  def __delitem__(self, key):
+    """
+    >>> mr = MatchResult("NP")
+    >>> mr["det"], mr["cn"] = "the", "dog"
+    >>> del mr["det"]
+    >>> mr
+    NP{'cn': 'dog'}
+    """
+    try:
+      i = self._fields.index(key)
+    except ValueError:
+      raise KeyError(key)
+    self._fields = _shared(self._fields[:i] + self._fields[i+1:])
+    self._values = self._values[:i] + self._values[i+1:]
+
+  def __eq__(self, other):
+    # Compare contents only, as dicts do
+    if isinstance(other, MatchResult):
+      other = dict(zip(other._fields, other._values))
+    elif not isinstance(other, dict):
+      return NotImplemented
+    return dict(zip(self._fields, self._values)) == other
+
+  def __ne__(self, other):
+    eq = self.__eq__(other)
+    if eq is NotImplemented:
+      return eq
+    return not eq
+
+  def keys(self):
+    return list(self._fields)
+
+  def values(self):
+    return list(self._values)
+
+  def items(self):
+    return zip(self._fields, self._values)
+
+  def itervalues(self):
+    return iter(self._values)
+
+  def iteritems(self):
+    return iter(zip(self._fields, self._values))
+
+  def get(self, key, default = None):
+    try:
+      return self._values[self._fields.index(key)]
+    except ValueError:
+      return default
+
+  def setdefault(self, key, default = None):
+    if key not in self._fields:
+      self[key] = default
+    return self[key]
+
+  def pop(self, key, *default):
+    if key not in self._fields:
+      if default:
+        return default[0]
+      raise KeyError(key)
+    value = self[key]
+    del self[key]
+    return value
+
+  def popitem(self):
+    if not self._fields:
+      raise KeyError('popitem(): dictionary is empty')
+    item = self._fields[-1], self._values[-1]
+    self._fields = _shared(self._fields[:-1])
+    self._values = self._values[:-1]
+    return item
+
+  def update(self, other = (), **kwargs):
+    if hasattr(other, 'keys'):
+      other = [(k, other[k]) for k in other.keys()]
+    for k, v in other:
+      self[k] = v
+    for k, v in kwargs.items():
+      self[k] = v
+
+  def clear(self):
+    self._fields = ()
+    self._values = ()
+
+  def copy(self):
+    return _restore(self._token_type, self._fields, self._values, self._span)
+
+  def to_dict(self):
+    """
+    Return the fields as a plain dict. Results bound inside it are left as
+    they are, so as json's default it encodes a result the way it encoded
+    the dicts results used to be.
+
+    >>> import json
+    >>> np = MatchResult("NP")
+    >>> np["det"], np["cn"] = "the", MatchResult("CN")
+    >>> np["cn"]["n"] = "dog"
+    >>> json.dumps(np, default = MatchResult.to_dict, sort_keys = True)
+    '{"cn": {"n": "dog"}, "det": "the"}'
+    """
+    return dict(zip(self._fields, self._values))
+
+collections.MutableMapping.register(MatchResult)
+
+def _restore(token_type, fields, values, span = None):
+  """
+  Rebuild a MatchResult from its parts, sharing the field names.
+  """
+  result = MatchResult(token_type)
+  result._fields = _shared(fields)
+  result._values = values
+  result._span = span
+  return result
+
+def _shared(fields):
+  """
+  Return the shared copy of a tuple of field names.
+  """
+  shared = _FIELDS.get(fields)
+  if shared is None:
+    if len(_FIELDS) < _MAX_SHAPES:
+      shared = _FIELDS.setdefault(fields, fields)
+    else:
+      shared = fields
+  return shared
 
 # Doctest magic invocations
 if __name__ == "__main__":
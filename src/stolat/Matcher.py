@@ -8,14 +8,57 @@ The matcher implemented here simply looks for strings, and binds them to an
 output MatchToken.
 """
 
+import copy
+import inspect
+
 from MatchResult import MatchResult
+from MatchContext import MatchContext
+from Token import _span
+from Selection import Selection, OVERLAPS
+
+def _takes_buffer_only(match):
+  """
+  Tell whether a _match method takes the buffer but no context.
+  """
+  args, varargs, _, _ = inspect.getargspec(match)
+  return len(args) == 2 and varargs is None
+
+def _ignoring_context(match):
+  def _match(self, buf, context):
+    return match(self, buf)
+  _match.__doc__ = match.__doc__
+  return _match
+
+class _MatcherType(type):
+  """
+  Matchers were once called as _match(buf), before the window moved into
+  a context. A subclass still written that way has its _match wrapped to
+  take the context as well, so that every caller can pass it.
+  """
+
+  def __init__(cls, name, bases, namespace):
+    match = namespace.get('_match')
+    if inspect.isfunction(match) and _takes_buffer_only(match):
+      cls._match = _ignoring_context(match)
+    super(_MatcherType, cls).__init__(name, bases, namespace)
 
 class Matcher(object):
   """
   A Matcher takes a stream of tokens to a stream of tokens, augmenting them
   along the way when a match is found.
+
+  Matchers hold no per-stream state, so one grammar can be applied to any
+  number of streams at once, including from several threads.
   """
 
+  __metaclass__ = _MatcherType
+
+  # The policy applied to this matcher's matches, and the key of the
+  # selection state it shares with other rules, if any; see policy()
+  _dedupe = False
+  _overlap = None
+  _selection = None
+
   def __init__(self, pattern = None, match_type = None, buffer_length = 1, keep_original = True):
     """
     Create a new matcher that matches simple strings and lifts them to a
@@ -34,21 +77,49 @@ class Matcher(object):
     self._keep_original = keep_original
 
     self._buffer_length = buffer_length
-    self._buffer = []
-
-    self._forwardbuffer = []
 
   def __xor__(self, other):
     """
     Boost the buffer length for this matcher. Use to allow 'gapping' and
-    unrecognised tokens.
+    unrecognised tokens. The matcher itself is left unchanged; a boosted
+    copy is returned.
 
     >>> m = Matcher('dog') ^ 3
     >>> m._buffer_length
     4
     """
-    self._buffer_length += other
-    return self
+    boosted = copy.copy(self)
+    boosted._buffer_length += other
+    return boosted
+
+  def policy(self, dedupe = True, overlap = None):
+    """
+    Return a copy of this matcher that reports its matches according to
+    the given policy. With dedupe, a match binding exactly the same tokens
+    as one already reported is dropped, as happens when a boosted rule
+    sees the same tokens in several windows. overlap may be
+    'non-overlapping', which drops matches overlapping one already
+    reported, or 'leftmost-longest', which holds matches back until it can
+    pick the leftmost, longest of those that overlap. Held back matches
+    are reported late, when the decision is made.
+
+    >>> from Pattern import word
+    >>> cn = ((word("the") + word("dog")%"noun") >> "CN") ^ 2
+    >>> list(cn("the dog barked loudly".split()))
+    ['the', 'dog', CN{'noun': 'dog'}, CN{'noun': 'dog'}, CN{'noun': 'dog'}, 'barked', 'loudly']
+    >>> list(cn.policy()("the dog barked loudly".split()))
+    ['the', 'dog', CN{'noun': 'dog'}, 'barked', 'loudly']
+    """
+    if overlap not in OVERLAPS:
+      raise ValueError("unknown overlap policy %r"%(overlap,))
+    return self._with_policy(dedupe, overlap, None)
+
+  def _with_policy(self, dedupe, overlap, shared):
+    m = copy.copy(self)
+    m._dedupe = dedupe
+    m._overlap = overlap
+    m._selection = shared
+    return m
 
   def __or__(self, other):
     """
@@ -87,38 +158,206 @@ class Matcher(object):
     >>> matchr = Matcher("dog", "animal", keep_original=False)
     >>> list(matchr("the dog and the cat were best of friends".split()))
     [animal{'token': 'dog'}]
+
+    Each call gets its own window, so streams can be interleaved freely:
+    >>> from Pattern import word
+    >>> cn = ((word("the") + word("dog")) >> "CN") ^ 1
+    >>> s1, s2 = cn("the dog".split()), cn("dog the".split())
+    >>> next(s1), next(s2), next(s1), next(s2), next(s1)
+    ('the', 'dog', 'dog', 'the', CN{})
+    >>> list(s2)
+    []
     """
+    context = MatchContext(self._buffer_length)
+    out = []
     for tok in gen:
-      forbuf = []
-      if self._keep_original:
-        yield tok
-      
-      for r in self._results([tok]):
-        yield r
-        forbuf.append(r)
-      
-      for r in self._results(forbuf):
-        yield r
-        forbuf.append(r)
-
-  def _results(self, toks):
-    for tok in toks:
-      self._buffer.insert(0, tok)
-      # Limit buffer to finite length
-      self._buffer = self._buffer[:self._buffer_length]
-      for r in self._match(self._buffer):
+      self._feed(context, tok, out)
+      for r in out:
         yield r
+      del out[:]
+
+    # Report any matches the policy was still holding back
+    for r in self._drain(context):
+      yield r
+
+  def _feed(self, context, tok, out):
+    """
+    Push one token through the matcher, appending to out everything it
+    gives rise to: the token itself if it is kept, then its results. The
+    results are fed back into the window in turn, so that rules can build
+    on each other.
+    """
+    if self._keep_original:
+      out.append(tok)
+
+    # Push the token, then each result in the order found; the list grows
+    # as it is walked
+    window = context.window
+    match = self._match
+    forbuf = [tok]
+    for t in forbuf:
+      # The window drops its oldest token itself once full
+      window.push(t)
+      context.pushed += 1
+      found = match(window, context)
+      if found:
+        out.extend(found)
+        forbuf.extend(found)
+
+  def _anchor(self):
+    """
+    Return a token that must be in the window for this matcher to fire, or
+    None if there is no such token. A MatchResult is represented by the
+    pair (MatchResult, token_type). UnionMatcher uses this to skip
+    submatchers that cannot match the current window.
+
+    A subclass with its own _match may fire on tokens other than its
+    pattern, so it has no anchor unless it says otherwise:
+    >>> class Dog(Matcher):
+    ...   def _match(self, buf, context):
+    ...     if buf[0] == "dog":
+    ...       return [MatchResult(self._match_type)]
+    ...     return []
+    >>> Matcher("cat")._anchor(), Dog("cat", "X")._anchor()
+    ('cat', None)
+    >>> m = Dog("cat", "X") | Matcher("mouse")
+    >>> list(m("the dog".split()))
+    ['the', 'dog', X{}]
+    """
+    if type(self)._match.im_func is not Matcher._match.im_func:
+      return None
+    return _hashable(self._pattern)
+
+  def _regexp_anchor(self):
+    """
+    Return a RegexpPattern that some token in the window must match for
+    this matcher to fire, or None. UnionMatcher uses this to skip matchers
+    with no plain anchor once it knows which regexps the window satisfies.
+    """
+    return None
+
+  def _fuzzy_anchor(self):
+    """
+    Return a FuzzyPattern that some token in the window must be near for
+    this matcher to fire, or None; used like _regexp_anchor.
+    """
+    return None
+
+  def _patterns(self):
+    """
+    Return the leaf patterns this matcher tests tokens with.
+    """
+    return []
+
+  def _produces(self):
+    """
+    Return the set of result types this matcher can produce.
+    """
+    return set([self._match_type])
+
+  def _requires(self):
+    """
+    Return the set of result types this matcher builds on with token().
+    """
+    from TokenPattern import TokenPattern
+    return set(p.token_type for p in self._patterns() if isinstance(p, TokenPattern))
+
+  def prune(self, types):
+    """
+    Return a matcher that only runs the rules needed to produce results of
+    the given types; see UnionMatcher.prune. A single matcher is kept if it
+    produces one of the types, and otherwise replaced by a matcher that
+    passes the stream through untouched.
+
+    >>> list(Matcher("dog").prune(["cat"])("the dog".split()))
+    ['the', 'dog']
+    """
+    from UnionMatcher import UnionMatcher
+    union = UnionMatcher([self])
+    union._keep_original = self._keep_original
+    pruned = union.prune(types)
+    return self if pruned._submatchers else pruned
+
+  def intern(self, vocab):
+    """
+    Return a copy of this matcher that runs over token ids from the given
+    Vocabulary, as produced by its encode method. Literals become ids.
 
-  def _match(self, buf):
+    >>> from Vocabulary import Vocabulary
+    >>> v = Vocabulary()
+    >>> list(v.decode(Matcher("dog").intern(v)(v.encode(["the", "dog"]))))
+    ['the', 'dog', dog{'token': 'dog'}]
+    """
+    m = copy.copy(self)
+    if isinstance(self._pattern, basestring):
+      m._pattern = vocab.intern(self._pattern)
+    return m
+
+  def compile(self):
+    """
+    Return an equivalent matcher that is cheaper to run per token. A plain
+    Matcher only ever looks at the newest token, so it is returned as is.
+    """
+    return self
+
+  def _match(self, buf, context):
     """
     Perform a simple equality match. Override this method in your sub-classes.
+    Any state kept between tokens belongs in the context, not the matcher.
+
+    Subclasses whose _match takes the buffer alone still work:
+    >>> class Dog(Matcher):
+    ...   def _match(self, buf):
+    ...     if buf[0] == "dog":
+    ...       return [MatchResult(self._match_type)]
+    ...     return []
+    >>> list((Dog(None, "X") | Matcher("cat"))("the dog".split()))
+    ['the', 'dog', X{}]
     """
     if buf[0] == self._pattern:
       result = MatchResult(self._match_type)
       result["token"] = buf[0]
-      return [result]
+      result._span = _span(buf[0])
+      matches = [result]
     else:
+      matches = []
+    if self._dedupe or self._overlap:
+      return self._select(buf, context, [([context.pushed - 1], r) for r in matches])
+    return matches
+
+  def _select(self, buf, context, matches):
+    """
+    Apply this matcher's policy to its new matches, given as pairs of the
+    stream positions bound and the result, and return the results to
+    report now. Called for every window, matched or not, so that held
+    back matches are released in time.
+    """
+    selection = context.state(self._selection or self, self._new_selection)
+    for positions, result in matches:
+      selection.offer(positions, result)
+    return selection.decide(context.pushed - len(buf))
+
+  def _new_selection(self):
+    return Selection(self._dedupe, self._overlap)
+
+  def _drain(self, context):
+    """
+    Return the results held back by this matcher's policy at the end of a
+    stream.
+    """
+    if not (self._dedupe or self._overlap):
       return []
+    return context.state(self._selection or self, self._new_selection).drain()
+
+def _hashable(key):
+  """
+  Return the key if it can be used in a dispatch index, otherwise None.
+  """
+  try:
+    hash(key)
+  except TypeError:
+    return None
+  return key
 
 # Doctest magic invocation
 if __name__ == "__main__":
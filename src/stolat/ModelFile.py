@@ -0,0 +1,274 @@
+"""
+ModelFile.py
+
+A compact on-disk format for compiled Corrector models. Every table is laid
+out as flat arrays that are read in place through mmap, so opening a model
+costs next to nothing and processes that open the same file share its pages
+rather than each holding a private copy.
+
+The file starts with a fixed header followed by three sections:
+
+  alphabet  length-prefixed string of every letter in the corpus
+  words     hashed string table of known words, with one count per word
+  deletes   hashed string table of deletion strings, with a posting list of
+            word numbers per string
+
+A hashed string table holds its entry and slot counts, an open-addressing
+slot array keyed by CRC-32, the offsets of each key and the concatenated
+keys. All integers are little-endian.
+"""
+import array
+import mmap
+import struct
+import sys
+import zlib
+
+MAGIC = 'STOLATC1'
+
+# magic, smoothing, integral counts, unicode keys, then section offsets
+_HEADER = struct.Struct('<8sdBB6xQQQ')
+_UINT = struct.Struct('<I')
+_UINT2 = struct.Struct('<II')
+
+def save_model(path, corpus, alphabet, deletes, smoothing):
+  """
+  Write a model to the given path. corpus maps words to counts, deletes maps
+  deletion strings to lists of words.
+  """
+  words = list(corpus)
+  unicode_keys = any(isinstance(w, unicode) for w in words)
+  counts = [corpus[w] for w in words]
+  integral = all(isinstance(c, (int, long)) for c in counts)
+  numbers = dict((w, i) for i, w in enumerate(words))
+
+  f = open(path, 'wb')
+  try:
+    f.write('\0' * _HEADER.size)
+
+    alphabet_off = f.tell()
+    letters = _encode(u''.join(sorted(alphabet)) if unicode_keys else ''.join(sorted(alphabet)))
+    f.write(_UINT.pack(len(letters)))
+    f.write(letters)
+
+    words_off = f.tell()
+    _write_table(f, [_encode(w) for w in words])
+    f.write(struct.pack('<%d%s'%(len(counts), 'q' if integral else 'd'), *counts))
+
+    deletes_off = f.tell()
+    keys = list(deletes)
+    _write_table(f, [_encode(k) for k in keys])
+    offsets = array.array('I', [0])
+    postings = array.array('I')
+    for k in keys:
+      postings.extend(numbers[w] for w in deletes[k])
+      offsets.append(len(postings))
+    f.write(_array('I', offsets))
+    f.write(_array('I', postings))
+
+    f.seek(0)
+    f.write(_HEADER.pack(MAGIC, smoothing, integral, unicode_keys,
+                         alphabet_off, words_off, deletes_off))
+  finally:
+    f.close()
+
+class ModelFile(object):
+  """
+  A model file opened through mmap. The counts and deletes attributes are
+  read-only mappings over the file that behave like the dictionaries a
+  Corrector builds in memory.
+
+  Pickling a ModelFile stores only its path; unpickling maps the file again,
+  so a model can be shipped to worker processes cheaply.
+  """
+
+  def __init__(self, path):
+    self._open(path)
+
+  def _open(self, path):
+    self.path = path
+    f = open(path, 'rb')
+    try:
+      self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    finally:
+      f.close()
+
+    magic, smoothing, integral, unicode_keys, alphabet_off, words_off, deletes_off = \
+      _HEADER.unpack_from(self._mm, 0)
+    if magic != MAGIC:
+      raise ValueError("%s is not a stolat model file"%path)
+    self.smoothing = smoothing
+    self._unicode = bool(unicode_keys)
+
+    n, = _UINT.unpack_from(self._mm, alphabet_off)
+    start = alphabet_off + _UINT.size
+    self.alphabet = set(self._decode(self._mm[start:start + n]))
+
+    words = _Table(self._mm, words_off, self._decode)
+    self.counts = MappedCounts(self, words, 'q' if integral else 'd')
+    self.deletes = MappedIndex(self, _Table(self._mm, deletes_off, self._decode), words)
+
+  def _decode(self, data):
+    if self._unicode:
+      return data.decode('utf-8')
+    return data
+
+  def __getstate__(self):
+    return {'path': self.path}
+
+  def __setstate__(self, state):
+    self._open(state['path'])
+
+class MappedCounts(object):
+  """
+  A read-only mapping from words to counts, read from a model file.
+  """
+
+  def __init__(self, model, table, kind):
+    self._model = model
+    self._table = table
+    self._value = struct.Struct('<' + kind)
+
+  def __reduce__(self):
+    return (getattr, (self._model, 'counts'))
+
+  def __len__(self):
+    return len(self._table)
+
+  def __iter__(self):
+    return self._table.keys()
+
+  def __contains__(self, word):
+    return self._table.find(word) >= 0
+
+  def __getitem__(self, word):
+    i = self._table.find(word)
+    if i < 0:
+      raise KeyError(word)
+    return self._value.unpack_from(self._table.mm, self._table.values + i * self._value.size)[0]
+
+  def get(self, word, default = None):
+    try:
+      return self[word]
+    except KeyError:
+      return default
+
+class MappedIndex(object):
+  """
+  A read-only mapping from deletion strings to the words they index, read
+  from a model file.
+  """
+
+  def __init__(self, model, table, words):
+    self._model = model
+    self._table = table
+    self._words = words
+    self._offsets = table.values
+    self._postings = table.values + (len(table) + 1) * _UINT.size
+
+  def __reduce__(self):
+    return (getattr, (self._model, 'deletes'))
+
+  def __len__(self):
+    return len(self._table)
+
+  def __iter__(self):
+    return self._table.keys()
+
+  def __contains__(self, key):
+    return self._table.find(key) >= 0
+
+  def __getitem__(self, key):
+    i = self._table.find(key)
+    if i < 0:
+      raise KeyError(key)
+    mm = self._table.mm
+    start, end = _UINT2.unpack_from(mm, self._offsets + i * _UINT.size)
+    numbers = struct.unpack_from('<%dI'%(end - start), mm, self._postings + start * _UINT.size)
+    return [self._words.key(n) for n in numbers]
+
+  def get(self, key, default = None):
+    try:
+      return self[key]
+    except KeyError:
+      return default
+
+class _Table(object):
+  """
+  A hashed string table within a mapped file. Keys are found by CRC-32 and
+  linear probing, so a lookup touches a handful of slots whatever the size
+  of the table.
+  """
+
+  def __init__(self, mm, offset, decode):
+    self.mm = mm
+    self._decode = decode
+    self._n, self._nslots = _UINT2.unpack_from(mm, offset)
+    self._slots = offset + _UINT2.size
+    self._key_offsets = self._slots + self._nslots * _UINT.size
+    self._keys = self._key_offsets + (self._n + 1) * _UINT.size
+    blob, = _UINT.unpack_from(mm, self._key_offsets + self._n * _UINT.size)
+    self.values = self._keys + blob
+
+  def __len__(self):
+    return self._n
+
+  def find(self, key):
+    """
+    Return the entry number of the given key, or -1 if it is absent.
+    """
+    key = _encode(key)
+    mm = self.mm
+    nslots = self._nslots
+    slot = (zlib.crc32(key) & 0xffffffff) % nslots
+    while True:
+      entry, = _UINT.unpack_from(mm, self._slots + slot * _UINT.size)
+      if entry == 0:
+        return -1
+      entry -= 1
+      start, end = _UINT2.unpack_from(mm, self._key_offsets + entry * _UINT.size)
+      if mm[self._keys + start:self._keys + end] == key:
+        return entry
+      slot += 1
+      if slot == nslots:
+        slot = 0
+
+  def key(self, entry):
+    start, end = _UINT2.unpack_from(self.mm, self._key_offsets + entry * _UINT.size)
+    return self._decode(self.mm[self._keys + start:self._keys + end])
+
+  def keys(self):
+    for entry in xrange(self._n):
+      yield self.key(entry)
+
+def _write_table(f, keys):
+  """
+  Write a hashed string table for the given encoded keys. Slots are kept at
+  most half full so that probe sequences stay short.
+  """
+  nslots = max(2 * len(keys), 1)
+  slots = array.array('I', [0]) * nslots
+  offsets = array.array('I', [0])
+  for i, key in enumerate(keys):
+    slot = (zlib.crc32(key) & 0xffffffff) % nslots
+    while slots[slot]:
+      slot = (slot + 1) % nslots
+    slots[slot] = i + 1
+    offsets.append(offsets[-1] + len(key))
+  f.write(_UINT2.pack(len(keys), nslots))
+  f.write(_array('I', slots))
+  f.write(_array('I', offsets))
+  f.write(''.join(keys))
+
+def _array(kind, values):
+  """
+  Return the little-endian bytes of an array of the given kind.
+  """
+  a = array.array(kind, values)
+  if sys.byteorder == 'big':
+    a.byteswap()
+  return a.tostring()
+
+def _encode(key):
+  if isinstance(key, unicode):
+    return key.encode('utf-8')
+  return key
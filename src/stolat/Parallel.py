@@ -0,0 +1,33 @@
+"""
+Parallel.py
+
+Helpers for fanning work out over a multiprocessing pool while keeping the
+amount of queued work bounded.
+"""
+import collections
+
+def bounded_imap(pool, func, iterable, max_pending):
+  """
+  Apply func to every item of iterable in the pool, yielding the results in
+  order. Unlike Pool.imap, which drains the whole iterable into its task
+  queue up front, at most max_pending items are in flight at once, so memory
+  stays bounded however long the input is.
+
+  >>> import multiprocessing
+  >>> pool = multiprocessing.Pool(2)
+  >>> list(bounded_imap(pool, abs, xrange(-5, 0), 2))
+  [5, 4, 3, 2, 1]
+  >>> pool.terminate()
+  """
+  pending = collections.deque()
+  for item in iterable:
+    if len(pending) >= max_pending:
+      yield pending.popleft().get()
+    pending.append(pool.apply_async(func, (item,)))
+  while pending:
+    yield pending.popleft().get()
+
+# Doctest magic
+if __name__ == "__main__":
+  import doctest
+  doctest.testmod()
@@ -4,7 +4,11 @@ Pattern.py
 Implements a pattern to be matched by a matcher.
 """
 
+import copy
+from itertools import islice
+
 from PatternMatcher import PatternMatcher
+from Window import tail
 
 class Pattern(object):
   """
@@ -27,12 +31,130 @@ class Pattern(object):
     >>> buf.reverse()
     >>> Pattern("dog").matches(buf)
     ('dog', ['the'])
+
+    This is a compatibility wrapper around scan, returning the rest of the
+    buffer rather than an offset into it.
+    """
+    result, end = self.scan(buf)
+    if result is None:
+      return None, []
+    return result, tail(buf, end)
+
+  def scan(self, buf, start = 0, bound = None):
+    """
+    Match a single word from the buffer at or after the given offset.
+    Returns the bound value and the offset just past it, or None and the
+    length of the buffer if there was no match. The buffer is never copied.
+    If a bound list is given, the offset of each token bound is appended
+    to it.
+
+    >>> buf = "the dog ran away".split()
+    >>> buf.reverse()
+    >>> Pattern("dog").scan(buf)
+    ('dog', 3)
+    >>> Pattern("dog").scan(buf, 3)
+    (None, 4)
+    >>> bound = []
+    >>> Pattern("dog").scan(buf, 0, bound), bound
+    (('dog', 3), [2])
+
+    Subclasses written before scan existed override matches instead; it is
+    run on a copy of the buffer and the remainder it returns is turned back
+    into an offset, taking the token before it to be the one bound.
+    >>> class Upper(Pattern):
+    ...   def matches(self, buf):
+    ...     for i, t in enumerate(buf):
+    ...       if isinstance(t, str) and t.isupper():
+    ...         return t, buf[i+1:]
+    ...     return None, []
+    >>> buf = "the BBC said".split()
+    >>> buf.reverse()
+    >>> Upper().scan(buf), Upper().scan(buf, 2)
+    (('BBC', 2), (None, 3))
+    >>> list((Upper() >> "U")("the BBC said".split()))
+    ['the', 'BBC', U{}, 'said']
+    """
+    if type(self) is not Pattern and _overrides_matches(type(self)):
+      return self._scan_matches(buf, start, bound)
+    pattern = self.pattern
+    for i, t in enumerate(islice(buf, start, None), start):
+      if t == pattern:
+        if bound is not None:
+          bound.append(i)
+        return t, i + 1
+    return None, len(buf)
+
+  def _scan_matches(self, buf, start, bound):
+    """
+    Run a subclass's own matches method in place of scan.
     """
-    buf_length = len(buf)
-    for i in range(buf_length):
-      if buf[i] == self.pattern:
-        return buf[i], buf[i+1:]
-    return None, []
+    result, rest = self.matches(list(islice(buf, start, None)))
+    if result is None:
+      return None, len(buf)
+    end = len(buf) - len(rest)
+    if bound is not None:
+      bound.append(end - 1)
+    return result, end
+
+  def _leaves(self):
+    """
+    Return the single-token patterns this pattern is built from, in the
+    order scan visits them.
+    """
+    return [self]
+
+  def _anchor(self):
+    """
+    Return a token that must be in the window for this pattern to match,
+    or None if there is none. Subclasses match tokens other than their
+    pattern, so they have none unless they say otherwise.
+
+    >>> class Upper(Pattern):
+    ...   def _match_token(self, tok):
+    ...     return tok if isinstance(tok, str) and tok.isupper() else None
+    ...   def scan(self, buf, start = 0, bound = None):
+    ...     for i, t in enumerate(islice(buf, start, None), start):
+    ...       if self._match_token(t) is not None:
+    ...         return t, i + 1
+    ...     return None, len(buf)
+    >>> Pattern("dog")._anchor(), Upper("x")._anchor()
+    ('dog', None)
+    >>> from RegexpPattern import re
+    >>> m = (Upper("x") >> "U") | (re("[0-9]+") >> "N") | (word("said") >> "S")
+    >>> list(m("the BBC said".split()))
+    ['the', 'BBC', U{}, 'said', S{}]
+    """
+    if type(self) is not Pattern:
+      return None
+    from Matcher import _hashable
+    return _hashable(self.pattern)
+
+  def _match_token(self, tok):
+    """
+    Test a single token against this pattern, returning the value it would
+    bind or None. Used by compiled matchers in place of scan.
+
+    >>> Pattern("dog")._match_token("dog"), Pattern("dog")._match_token("cat")
+    ('dog', None)
+    """
+    if tok == self.pattern:
+      return tok
+    return None
+
+  def intern(self, vocab):
+    """
+    Return a copy of this pattern that matches token ids from the given
+    Vocabulary rather than strings.
+
+    >>> from Vocabulary import Vocabulary
+    >>> p = Pattern("dog").intern(Vocabulary(["the", "dog"]))
+    >>> p.pattern, p.scan([0, 1, 0])
+    (1, (1, 2))
+    """
+    p = copy.copy(self)
+    if isinstance(self.pattern, basestring):
+      p.pattern = vocab.intern(self.pattern)
+    return p
 
   def __len__(self):
     """
@@ -93,6 +215,12 @@ class Pattern(object):
 
 word = Pattern
 
+def _overrides_matches(klass):
+  """
+  Return whether a Pattern subclass provides its own matches method.
+  """
+  return klass.matches.im_func is not Pattern.matches.im_func
+
 # Doctest magic
 if __name__ == "__main__":
   import doctest
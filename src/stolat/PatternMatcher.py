@@ -6,7 +6,8 @@ adding any results to the stream itself.
 """
 
 from Matcher import Matcher
-from MatchResult import MatchResult
+from MatchResult import MatchResult, _restore
+from Token import _span, _covering
 
 class PatternMatcher(Matcher):
   """
@@ -17,15 +18,83 @@ class PatternMatcher(Matcher):
   def __init__(self, pattern, type_name, keep_original = True):
     super(PatternMatcher, self).__init__(pattern, type_name, len(pattern), keep_original)
 
-  def _match(self, buf):
+  def _anchor(self):
+    return self._pattern._anchor()
+
+  def _regexp_anchor(self):
+    from RegexpPattern import RegexpPattern
+    for p in self._pattern._leaves():
+      if isinstance(p, RegexpPattern):
+        return p
+    return None
+
+  def _fuzzy_anchor(self):
+    from FuzzyPattern import FuzzyPattern
+    for p in self._pattern._leaves():
+      if isinstance(p, FuzzyPattern):
+        return p
+    return None
+
+  def _patterns(self):
+    return self._pattern._leaves()
+
+  def compile(self):
     """
+    Return an equivalent matcher that runs the pattern as a token-level
+    automaton, or this matcher if the pattern cannot be compiled.
+
+    >>> from Pattern import word
+    >>> m = ((word("the") + word("dog")%"noun") >> "CN") ^ 2
+    >>> c = m.compile()
+    >>> c.__class__.__name__, c._buffer_length
+    ('AutomatonMatcher', 4)
     """
-    rs, remainder = self._pattern.matches(buf)
+    from AutomatonMatcher import AutomatonMatcher, compilable
+    # The automaton doesn't track which tokens it bound, which policies need
+    if not compilable(self._pattern) or self._dedupe or self._overlap:
+      return self
+    compiled = AutomatonMatcher(self._pattern, self._match_type, self._keep_original)
+    return compiled ^ (self._buffer_length - compiled._buffer_length)
+
+  def intern(self, vocab):
+    m = self.__class__(self._pattern.intern(vocab), self._match_type, self._keep_original)
+    m = m._with_policy(self._dedupe, self._overlap, self._selection)
+    return m ^ (self._buffer_length - m._buffer_length)
+
+  def _match(self, buf, context):
+    """
+    Slide the pattern over the buffer, lifting any binding to a MatchResult.
+    """
+    if self._dedupe or self._overlap:
+      bound = []
+      rs, end = self._pattern.scan(buf, 0, bound)
+      if rs is None:
+        return self._select(buf, context, [])
+      result = self._result(rs)
+      if _span(buf[0]) is not None:
+        result._span = _covering([buf[i] for i in bound])
+      pushed = context.pushed
+      return self._select(buf, context, [([pushed - 1 - i for i in bound], result)])
+
+    rs, end = self._pattern.scan(buf)
     if rs is not None:
-      r = MatchResult(self._match_type)
-      if isinstance(rs, dict):
-        for k,v in rs.items():
-          r[k] = v
-      return [r]
+      result = self._result(rs)
+      if _span(buf[0]) is not None:
+        # Matches are rarer than scans, so the tokens bound are only
+        # found again when there are spans to take from them
+        bound = []
+        self._pattern.scan(buf, 0, bound)
+        result._span = _covering([buf[i] for i in bound])
+      return [result]
     else:
       return []
+
+  def _result(self, rs):
+    """
+    Build the MatchResult for a successful pattern binding.
+    """
+    if isinstance(rs, MatchResult):
+      return _restore(self._match_type, rs._fields, rs._values)
+    if isinstance(rs, dict):
+      return _restore(self._match_type, tuple(rs), tuple(rs.itervalues()))
+    return MatchResult(self._match_type)
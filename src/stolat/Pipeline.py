@@ -0,0 +1,162 @@
+"""
+Pipeline.py
+
+Runs a tokenizer, Corrector, matchers and ResultFilter as one fused loop,
+rather than as a stack of generators.
+"""
+import itertools
+
+from Matcher import Matcher
+from MatchContext import MatchContext
+from MatchResult import MatchResult
+
+class Pipeline(object):
+  """
+  A callable object that runs a document through a tokenizer (by default,
+  splitting on whitespace), an optional Corrector, one or more matchers
+  and an optional ResultFilter, returning the list the composed stages
+  would have produced.
+
+  Composing the stages as generators costs a resumption per stage per
+  token, and more for the results each matcher feeds back into its
+  window. Here each token is taken through every stage in turn by one
+  loop, and the output is handed on a chunk of tokens at a time. Matchers
+  are given as a list when the output of one is to be matched by the
+  next, as in m2(m1(tokens)).
+
+  With prune set, the matchers are first cut down to the rules the
+  filter's types need. This can let the rules kept match more than they
+  would have, as the results of the dropped rules no longer take up room
+  in their windows; see UnionMatcher.prune.
+
+  >>> from Pattern import word
+  >>> from TokenPattern import token
+  >>> from ResultFilter import ResultFilter
+  >>> cn = (word("the") + word("dog")%"noun") >> "CN"
+  >>> vp = (token("CN")%"subj" + word("barked")) >> "VP"
+  >>> run = Pipeline([cn, vp], result_filter = ResultFilter(["VP"]))
+  >>> run("the dog barked")
+  [VP{'subj': CN{'noun': 'dog'}}]
+  >>> run("the dog barked") == list(ResultFilter(["VP"])(vp(cn("the dog barked".split()))))
+  True
+  """
+
+  def __init__(self, matchers, tokenize = None, corrector = None, result_filter = None,
+               prune = False, chunksize = 256):
+    if isinstance(matchers, Matcher):
+      matchers = [matchers]
+    matchers = list(matchers)
+    if prune and result_filter is not None:
+      matchers = _prune(matchers, result_filter._types)
+    self._matchers = matchers
+    self._tokenize = tokenize
+    self._corrector = corrector
+    self._result_filter = result_filter
+    self._chunksize = chunksize
+    super(Pipeline, self).__init__()
+
+  def __call__(self, document):
+    """
+    Run one document through the pipeline, returning a list.
+    """
+    tokens = self._tokenize(document) if self._tokenize else document.split()
+    return list(self.stream(tokens))
+
+  def stream(self, tokens):
+    """
+    Run a stream of tokens, already split, through every stage after the
+    tokenizer, yielding the output a chunk at a time. Arbitrarily long
+    streams can be run.
+
+    >>> from Matcher import Matcher
+    >>> run = Pipeline(Matcher("dog", "N"), chunksize = 2)
+    >>> list(run.stream(iter("the dog barked".split())))
+    ['the', 'dog', N{'token': 'dog'}, 'barked']
+    """
+    stages = self._stages()
+    correct = self._corrector._correct_token if self._corrector is not None else None
+
+    tokens = iter(tokens)
+    while True:
+      chunk = list(itertools.islice(tokens, self._chunksize))
+      if not chunk:
+        break
+      if correct is not None:
+        chunk = [correct(tok) for tok in chunk]
+      for tok in self._advance(stages, chunk):
+        yield tok
+
+    for tok in self._finish(stages):
+      yield tok
+
+  def feeder(self, executor = None, max_pending = 1024):
+    """
+    Return a Feeder, to push the tokens of one stream through the
+    pipeline as they arrive.
+    """
+    from Feeder import Feeder
+    return Feeder(self, executor, max_pending)
+
+  def _stages(self):
+    """
+    Return the per-stream state of the matchers: each paired with a fresh
+    context.
+    """
+    return [(m, MatchContext(m._buffer_length)) for m in self._matchers]
+
+  def _advance(self, stages, chunk):
+    """
+    Take a chunk of corrected tokens through every matcher and the
+    filter, returning the output.
+    """
+    for matcher, context in stages:
+      feed = matcher._feed
+      out = []
+      for tok in chunk:
+        feed(context, tok, out)
+      chunk = out
+    return _filtered(chunk, self._types())
+
+  def _finish(self, stages):
+    """
+    Return the output held back at the end of the stream, feeding each
+    matcher's into the next.
+    """
+    chunk = []
+    for matcher, context in stages:
+      out = []
+      for tok in chunk:
+        matcher._feed(context, tok, out)
+      out.extend(matcher._drain(context))
+      chunk = out
+    return _filtered(chunk, self._types())
+
+  def _types(self):
+    return self._result_filter._types if self._result_filter is not None else None
+
+def _filtered(toks, types):
+  """
+  Return the tokens a ResultFilter with the given types would let through.
+  """
+  if types is None:
+    return toks
+  return [t for t in toks if isinstance(t, MatchResult) and t.token_type in types]
+
+def _prune(matchers, types):
+  """
+  Prune a chain of matchers to the given types, working back from the last
+  so that each keeps the rules the ones after it build on.
+  """
+  needed = set(types)
+  pruned = []
+  for m in reversed(matchers):
+    m = m.prune(needed)
+    needed |= m._requires()
+    pruned.append(m)
+  pruned.reverse()
+  return pruned
+
+# Doctest magic
+if __name__ == "__main__":
+  import doctest
+  doctest.testmod()
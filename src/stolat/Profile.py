@@ -0,0 +1,230 @@
+"""
+Profile.py
+
+Opt-in instrumentation that records where the time goes in a grammar:
+per rule, per leaf pattern and, for a Corrector, per lookup path.
+"""
+import collections
+import copy
+import json
+import timeit
+
+from Matcher import Matcher
+from UnionMatcher import UnionMatcher
+from PatternMatcher import PatternMatcher
+from AutomatonMatcher import AutomatonMatcher
+from ChartMatcher import ChartMatcher
+from SequencePattern import SequencePattern
+from RegexpPattern import RegexpPattern
+from FuzzyPattern import FuzzyPattern
+from TokenPattern import TokenPattern
+from Pattern import Pattern
+from Corrector import Corrector
+
+timer = timeit.default_timer
+
+# The ways a Corrector can find a correction, cheapest first
+PATHS = ('cache', 'known', 'edit1', 'edit2', 'fallback')
+
+class Profile(object):
+  """
+  Collects statistics from the matchers and correctors it instruments.
+
+  instrument() returns an instrumented copy of a matcher or Corrector,
+  leaving the original untouched, so nothing is added to the grammars run
+  without it. For every rule, including each rule of a union, it counts
+  the calls to _match, how many found something, the results produced,
+  the window sizes seen and the cumulative time taken. For every leaf
+  pattern scanned it counts the scans, hits, tokens scanned and time.
+  Compiled automata and charts test their leaves directly, so their
+  leaves have no figures of their own. For a Corrector it counts the
+  lookups answered by each path: the cache, a known word, a word one or
+  two edits away, or the word itself.
+
+  A disabled profile hands back what it is given, so the calls can be
+  left in place and switched on when needed.
+
+  >>> from Pattern import word
+  >>> from RegexpPattern import re
+  >>> profile = Profile()
+  >>> m = profile.instrument(Matcher("dog", "N") | ((word("the") + re("cat|dog")%"n") >> "NP"))
+  >>> out = list(m("the dog saw the cat".split()))
+  >>> stats = profile.snapshot()
+  >>> sorted(stats["matchers"])
+  ['matcher', 'matcher/0:N', 'matcher/1:NP']
+  >>> r = stats["matchers"]["matcher/1:NP"]
+  >>> r["calls"], r["hits"], r["results"]
+  (4, 2, 2)
+  >>> sorted(stats["patterns"])
+  ["matcher/1:NP [0] re('cat|dog')", "matcher/1:NP [1] 'the'"]
+  >>> cor = profile.instrument(Corrector("the dog hit the cat".split()))
+  >>> out = list(cor("teh dgo teh cat xyzzy".split()))
+  >>> sorted(profile.snapshot()["correctors"]["corrector"].items())
+  [('cache', 1), ('edit1', 2), ('edit2', 0), ('fallback', 1), ('known', 1), ('lookups', 5)]
+  >>> Profile(enabled = False).instrument(m) is m
+  True
+  """
+
+  def __init__(self, enabled = True):
+    self.enabled = enabled
+    self._matchers = collections.OrderedDict()
+    self._patterns = collections.OrderedDict()
+    self._correctors = collections.OrderedDict()
+    super(Profile, self).__init__()
+
+  def instrument(self, target, name = None):
+    """
+    Return an instrumented copy of the given matcher or Corrector, whose
+    figures are reported under the given name.
+    """
+    if not self.enabled:
+      return target
+    if isinstance(target, Corrector):
+      return self._corrector(target, name or 'corrector')
+    if isinstance(target, Matcher):
+      return self._matcher(target, name or 'matcher')
+    raise TypeError("cannot profile %s"%type(target).__name__)
+
+  def snapshot(self):
+    """
+    Return the figures collected so far, as a dict of plain values.
+    """
+    return {
+      'matchers': dict((k, _summary(s, 'window')) for k, s in self._matchers.items()),
+      'patterns': dict((k, _summary(s, 'scanned')) for k, s in self._patterns.items()),
+      'correctors': dict((k, _lookups(c)) for k, c in self._correctors.items()),
+    }
+
+  def to_json(self):
+    """
+    Return the figures collected so far as a JSON document.
+    """
+    return json.dumps(self.snapshot(), indent = 2, sort_keys = True)
+
+  def reset(self):
+    """
+    Zero every figure, keeping the instrumentation in place.
+
+    >>> profile = Profile()
+    >>> m = profile.instrument(Matcher("dog"))
+    >>> out = list(m(["dog"]))
+    >>> profile.reset()
+    >>> profile.snapshot()["matchers"]["matcher"]["calls"]
+    0
+    """
+    for stats in self._matchers.values() + self._patterns.values():
+      for k in stats:
+        stats[k] = 0
+    for c in self._correctors.values():
+      c._hits = c._misses = c._evictions = 0
+      with c._paths_lock:
+        for k in c._paths:
+          c._paths[k] = 0
+
+  def _matcher(self, m, label):
+    m = copy.copy(m)
+    if isinstance(m, UnionMatcher):
+      m._submatchers = [self._matcher(s, "%s/%d:%s"%(label, i, s._match_type))
+                        for i, s in enumerate(m._submatchers)]
+    elif isinstance(m, PatternMatcher) and not isinstance(m, AutomatonMatcher):
+      m._pattern = self._pattern(m._pattern, label, [0])
+    stats = self._matchers[label] = _counters('window')
+    if isinstance(m, ChartMatcher):
+      # A chart builds everything from _feed
+      m._feed = _timed_feed(m._feed, stats, m._keep_original)
+    else:
+      m._match = _timed_match(m._match, stats)
+    return m
+
+  def _pattern(self, p, label, count):
+    p = copy.copy(p)
+    if isinstance(p, SequencePattern):
+      p.subpatterns = [self._pattern(s, label, count) for s in p.subpatterns]
+      return p
+    stats = self._patterns["%s [%d] %s"%(label, count[0], _describe(p))] = _counters('scanned')
+    count[0] += 1
+    p.scan = _timed_scan(p.scan, stats)
+    return p
+
+  def _corrector(self, cor, label):
+    # A copy of its own, with a cold cache, so its counters are its own
+    cor = copy.copy(cor)
+    cor._cache = {}
+    cor._clock = collections.deque()
+    cor._hits = cor._misses = cor._evictions = 0
+    cor._paths = dict.fromkeys(PATHS[1:], 0)
+    self._correctors[label] = cor
+    return cor
+
+def _counters(size):
+  return {'calls': 0, 'hits': 0, 'results': 0, 'seconds': 0.0, size: 0}
+
+def _summary(stats, size):
+  summary = dict(stats)
+  calls = stats['calls']
+  summary['hit_rate'] = float(stats['hits']) / calls if calls else 0.0
+  summary['mean_' + size] = float(stats[size]) / calls if calls else 0.0
+  return summary
+
+def _lookups(cor):
+  with cor._paths_lock:
+    paths = dict(cor._paths)
+  paths['cache'] = cor._hits
+  paths['lookups'] = sum(paths.values())
+  return paths
+
+def _describe(p):
+  if isinstance(p, RegexpPattern):
+    return "re(%r)"%p.regexp.pattern
+  if isinstance(p, FuzzyPattern):
+    return "fuzzy_word(%r, %d)"%(p.pattern, p.max_edits)
+  if isinstance(p, TokenPattern):
+    return "token(%r)"%(p.token_type,)
+  if type(p) is Pattern:
+    return repr(p.pattern)
+  return type(p).__name__
+
+def _timed_match(match, stats):
+  def timed(buf, context):
+    start = timer()
+    found = match(buf, context)
+    stats['seconds'] += timer() - start
+    stats['calls'] += 1
+    stats['window'] += len(buf)
+    if found:
+      stats['hits'] += 1
+      stats['results'] += len(found)
+    return found
+  return timed
+
+def _timed_feed(feed, stats, keep):
+  def timed(context, tok, out):
+    before = len(out)
+    start = timer()
+    feed(context, tok, out)
+    stats['seconds'] += timer() - start
+    stats['calls'] += 1
+    stats['window'] += 1
+    found = len(out) - before - (1 if keep else 0)
+    if found:
+      stats['hits'] += 1
+      stats['results'] += found
+  return timed
+
+def _timed_scan(scan, stats):
+  def timed(buf, start = 0, bound = None):
+    began = timer()
+    value, end = scan(buf, start, bound)
+    stats['seconds'] += timer() - began
+    stats['calls'] += 1
+    stats['scanned'] += len(buf) - start
+    if value is not None:
+      stats['hits'] += 1
+      stats['results'] += 1
+    return value, end
+  return timed
+
+# Doctest magic
+if __name__ == "__main__":
+  import doctest
+  doctest.testmod()
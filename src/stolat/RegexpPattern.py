@@ -4,23 +4,42 @@ RegexpPattern.py
 Implements a pattern that matches a given regexp.
 """
 
+import copy
 import re as RE
+import sre_parse
+import sre_constants as SRE
+from itertools import islice
 
 from Pattern import Pattern
 from MatchResult import MatchResult
+from TokenCache import TokenCache
 
 class RegexpPattern(Pattern):
   """
   A pattern that matches the given regexp.
+
+  Patterns can be pickled, as for sending to worker processes; the copy
+  builds its own prefilter and cache:
+  >>> import pickle
+  >>> p = pickle.loads(pickle.dumps(RegexpPattern('\$\d+')))
+  >>> p.scan(["the", "$12"]), p._prefilter("the")
+  (('$12', 2), False)
   """
 
   def __init__(self, regexp, type_name = None):
     self.regexp = RE.compile(regexp)
 
     self.type_name = type_name
+
+    # The pattern remembers its matches, after first ruling out what it
+    # can without running the regexp
+    self._prefilter = _prefilter(self.regexp)
+    self._matches = TokenCache()
+    # Set on interned copies, whose tokens are ids to be looked up
+    self._vocab = None
     super(RegexpPattern, self).__init__()
 
-  def matches(self, buf):
+  def scan(self, buf, start = 0, bound = None):
     """
     Searches for a token in the buffer which matches the given regexp.
     
@@ -37,37 +56,293 @@ class RegexpPattern(Pattern):
     >>> (Pattern('price') + RegexpPattern('\$(?P<dollars>\d+)(\.(?P<cents>\d{2}))?', 'CUREX')%'amt').matches(buf)
     ({'amt': CUREX{'cents': '35', 'dollars': '120', '_match': '$120.35'}}, ['the'])
 
+    The search starts at the given offset and returns the offset just past
+    the matching token
+    >>> RegexpPattern('\$\d+').scan(buf, 1)
+    (None, 4)
+    """
+    vocab = self._vocab
+    matched = self._matches.get
+    for i, t in enumerate(islice(buf, start, None), start):
+      if not isinstance(t, MatchResult):
+        text = str(t) if vocab is None else vocab.string(t)
+        ms = matched(text)
+        if ms is None:
+          ms = self._match_text(text)
+        if ms:
+          if bound is not None:
+            bound.append(i)
+          return self._result(ms), i + 1
+    return None, len(buf)
+
+  def _anchor(self):
+    return None
+
+  def _match_token(self, tok):
+    """
+    Test a single token against the regexp, returning the value it would
+    bind or None.
+
+    >>> RegexpPattern('\$\d+')._match_token('$12')
+    '$12'
+    """
+    if isinstance(tok, MatchResult):
+      return None
+    text = str(tok) if self._vocab is None else self._vocab.string(tok)
+    ms = self._match_text(text)
+    if not ms:
+      return None
+    return self._result(ms)
+
+  def _match_text(self, text):
+    """
+    Return the regexp's match on the given token text, or False. Tokens
+    that the prefilter rules out are never given to the regexp, and the
+    outcome on the rest is remembered, so the regexp runs once per token
+    text rather than each time the window slides over it.
+
+    >>> p = RegexpPattern('\$\d+')
+    >>> p._match_text("the"), p._match_text("$x"), p._match_text("$12").group()
+    (False, False, '$12')
     """
-    buf_length = len(buf)
-    for i in range(buf_length):
-      if not isinstance(buf[i], MatchResult):
-        ms = self.regexp.match(str(buf[i]))
-        if ms is not None:
-          # Do we have named groups? If so, build a dictionary of them
-          if len(self.regexp.groupindex) > 0:
-            # If we don't have an explicit name for the MatchResult, calculate one from the field name
-            tname = self.type_name
-            if tname is None:
-              tname = self.field.capitalize()
-            # Copy the groups into a MatchResult object
-            result = MatchResult(tname)
-            result['_match'] = ms.group(0)
-            for k,n in self.regexp.groupindex.items():
-              # If the group isn't none in this instance
-              if ms.group(n) is not None:
-                result[k] = ms.group(n)
-            return result, buf[i+1:]
-          else:
-            if self.field is not None:
-              rd = {}
-              rd[self.field] = ms.group(0)
-              return rd, buf[i+1:]
-            else:
-              return ms.group(0), buf[i+1:]
-    return None, []
+    ms = self._matches.get(text)
+    if ms is None:
+      prefilter = self._prefilter
+      if prefilter is None or prefilter(text):
+        ms = self.regexp.match(text) or False
+      else:
+        ms = False
+      self._matches.put(text, ms)
+    return ms
+
+  def __getstate__(self):
+    # Neither match objects nor the prefilter, a closure, can be pickled;
+    # the copy builds its own from the regexp, and starts with an empty
+    # cache
+    state = self.__dict__.copy()
+    del state['_matches'], state['_prefilter']
+    return state
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self._prefilter = _prefilter(self.regexp)
+    self._matches = TokenCache()
+
+  def intern(self, vocab):
+    """
+    Return a copy of this pattern that looks up the text of token ids in
+    the given Vocabulary before running the regexp.
+
+    >>> from Vocabulary import Vocabulary
+    >>> RegexpPattern('\d+').intern(Vocabulary(["a", "12"])).scan([0, 1])
+    ('12', 2)
+    """
+    p = copy.copy(self)
+    p._vocab = vocab
+    return p
+
+  def _result(self, ms):
+    """
+    Build the value bound by a successful regexp match.
+    """
+    # Do we have named groups? If so, build a dictionary of them
+    if len(self.regexp.groupindex) > 0:
+      # If we don't have an explicit name for the MatchResult, calculate one from the field name
+      tname = self.type_name
+      if tname is None:
+        tname = self.field.capitalize()
+      # Copy the groups into a MatchResult object
+      result = MatchResult(tname)
+      result['_match'] = ms.group(0)
+      for k,n in self.regexp.groupindex.items():
+        # If the group isn't none in this instance
+        if ms.group(n) is not None:
+          result[k] = ms.group(n)
+      return result
+    else:
+      if self.field is not None:
+        rd = {}
+        rd[self.field] = ms.group(0)
+        return rd
+      else:
+        return ms.group(0)
 
 re = RegexpPattern
 
+# Characters matched by the categories that don't depend on the locale
+_CATEGORIES = {
+  SRE.CATEGORY_DIGIT: "0123456789",
+  SRE.CATEGORY_SPACE: " \t\n\r\f\v",
+  SRE.CATEGORY_WORD: "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_",
+}
+
+def _prefilter(regexp):
+  """
+  Return a test that is false for token text the compiled regexp can't
+  match, built from its literal prefix, the characters a match has to
+  start with and the lengths a match can have, or None if nothing cheap is
+  known. The test is only a necessary condition; texts that pass it still
+  have to be run through the regexp.
+
+  >>> test = _prefilter(RE.compile("\\$(?P<d>\\d+)(\\.\\d{2})?"))
+  >>> test("the"), test("$"), test("$12.50")
+  (False, False, True)
+  >>> test = _prefilter(RE.compile("(jan|feb)[a-z]*|[0-9]{1,2}"))
+  >>> test("feb"), test("march"), test("12"), test("1a")
+  (True, False, True, True)
+  >>> test = _prefilter(RE.compile("[0-9]{1,2}$"))
+  >>> test("12"), test("1234")
+  (True, False)
+  >>> test = _prefilter(RE.compile("(?m)[0-9]{1,2}$"))
+  >>> test("12\\nfoo")
+  True
+  >>> RegexpPattern("(?m)\\d{1,2}$").scan(["12\\nfoo"])
+  ('12', 1)
+
+  A backreference can match more than the group it refers to did:
+  >>> RegexpPattern(r"(a{1,2})\\1$").scan(["aaaa"])
+  ('aaaa', 1)
+
+  Only the length is known of a case-insensitive regexp:
+  >>> test = _prefilter(RE.compile("(?i)jan"))
+  >>> test("JAN"), test("ja")
+  (True, False)
+  >>> _prefilter(RE.compile(".*")) is None
+  True
+  """
+  try:
+    parsed = sre_parse.parse(regexp.pattern, regexp.flags)
+    shortest, longest = parsed.getwidth()
+    ops = list(parsed)
+  except Exception:
+    # The parser is internal to the re module; if it has changed shape,
+    # do without
+    return None
+
+  # A match need only cover a prefix of the text, unless it is anchored at
+  # the end, which $ allows to be followed by a newline; in multiline mode
+  # $ matches before any newline, so it bounds nothing. The parser counts
+  # backreferences and lookarounds as matching nothing, so the longest
+  # match of a regexp using them isn't known
+  if _uses(ops, (SRE.GROUPREF, SRE.GROUPREF_EXISTS, SRE.ASSERT, SRE.ASSERT_NOT)):
+    longest = None
+  elif ops and ops[-1] == (SRE.AT, SRE.AT_END_STRING):
+    pass
+  elif ops and ops[-1] == (SRE.AT, SRE.AT_END) and not regexp.flags & RE.MULTILINE:
+    longest += 1
+  else:
+    longest = None
+  if longest is not None and longest >= SRE.MAXREPEAT:
+    longest = None
+
+  # Case-insensitive and locale-dependent patterns match characters other
+  # than those they are written with
+  prefix = ''
+  firsts = None
+  if not regexp.flags & (RE.IGNORECASE | RE.LOCALE | RE.UNICODE) and isinstance(regexp.pattern, str):
+    prefix = _prefix(ops)
+    if not prefix:
+      firsts = _firsts(ops)
+      if firsts is not None:
+        firsts = frozenset(firsts)
+
+  if not prefix and firsts is None and shortest == 0 and longest is None:
+    return None
+
+  def test(text):
+    n = len(text)
+    if n < shortest or (longest is not None and n > longest):
+      return False
+    if prefix:
+      return text.startswith(prefix)
+    if firsts is not None:
+      return text[0] in firsts
+    return True
+  return test
+
+def _uses(ops, kinds):
+  """
+  Say whether any of the parsed ops, however deeply nested, is of one of
+  the given kinds.
+
+  >>> ops = list(sre_parse.parse(r"(x|(a)+)\\2"))
+  >>> _uses(ops, (SRE.GROUPREF,)), _uses(ops, (SRE.ASSERT,))
+  (True, False)
+  """
+  for op, av in ops:
+    if op in kinds:
+      return True
+    if op == SRE.BRANCH:
+      nested = av[1]
+    elif op == SRE.SUBPATTERN:
+      nested = [av[-1]]
+    elif op in (SRE.MAX_REPEAT, SRE.MIN_REPEAT):
+      nested = [av[2]]
+    else:
+      continue
+    if any(_uses(sub, kinds) for sub in nested):
+      return True
+  return False
+
+def _prefix(ops):
+  """
+  Return the literal text every match of the parsed ops starts with.
+  """
+  chars = []
+  for op, av in ops:
+    if op == SRE.LITERAL:
+      chars.append(chr(av))
+    elif op == SRE.AT and av in (SRE.AT_BEGINNING, SRE.AT_BEGINNING_STRING) and not chars:
+      continue
+    else:
+      break
+  return ''.join(chars)
+
+def _firsts(ops):
+  """
+  Return the set of characters every match of the parsed ops starts with,
+  or None if it can't be told.
+  """
+  for op, av in ops:
+    if op in (SRE.AT, SRE.ASSERT, SRE.ASSERT_NOT):
+      # These match no characters, so look past them
+      continue
+    if op == SRE.LITERAL:
+      return set(chr(av))
+    if op == SRE.IN:
+      return _class(av)
+    if op == SRE.BRANCH:
+      chars = set()
+      for branch in av[1]:
+        firsts = _firsts(branch)
+        if firsts is None:
+          return None
+        chars |= firsts
+      return chars
+    if op == SRE.SUBPATTERN:
+      return _firsts(av[-1])
+    if op in (SRE.MAX_REPEAT, SRE.MIN_REPEAT) and av[0] > 0:
+      return _firsts(av[2])
+    return None
+  return None
+
+def _class(items):
+  """
+  Return the characters matched by a parsed character class, or None if
+  it is negated or uses a category we don't know the members of.
+  """
+  chars = set()
+  for op, av in items:
+    if op == SRE.LITERAL:
+      chars.add(chr(av))
+    elif op == SRE.RANGE:
+      chars.update(chr(c) for c in range(av[0], av[1] + 1))
+    elif op == SRE.CATEGORY and av in _CATEGORIES:
+      chars.update(_CATEGORIES[av])
+    else:
+      return None
+  return chars
+
 # Doctest magic
 if __name__ == "__main__":
   import doctest
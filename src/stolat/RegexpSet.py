@@ -0,0 +1,189 @@
+"""
+RegexpSet.py
+
+Tests a token against many regexps at once by folding them into combined
+alternations.
+"""
+import re as RE
+
+from TokenCache import TokenCache
+
+# Python's re module refuses patterns with more than 100 groups, and each
+# member of an alternation costs one tagging group
+_CHUNK = 90
+
+class RegexpSet(object):
+  """
+  A set of RegexpPatterns that are tested together. The members are joined
+  into alternations of tagged groups, (?P<_r0>...)|(?P<_r1>...)|..., with
+  their own groups made non-capturing. Python tries the alternatives in
+  order, so a match on tag j shows that no earlier member matches; the scan
+  then carries on with the alternation of the members after j. A token is
+  therefore scanned once per member it satisfies, plus once, rather than
+  once per member.
+
+  The set leaves its members alone, so a pattern may be in any number of
+  sets. A UnionMatcher asks the set which members the tokens in the window
+  match, to pick the rules worth running; the patterns of those rules then
+  test the tokens themselves. Verdicts are cached per token text. Members
+  using backreferences, conditionals or inline flags can't share an
+  alternation and are tested on their own.
+
+  >>> from RegexpPattern import re
+  >>> num, word, dollars = re("\\d+"), re("(?P<w>[a-z]+)"), re("\\$(\\d+)")
+  >>> rs = RegexpSet([num, word, dollars])
+  >>> rs.verdict("42"), rs.verdict("dog"), rs.verdict("$5"), rs.verdict("!")
+  (1, 2, 4, 0)
+  >>> rs.bit(word), rs.bit(re("\\d+"))
+  (2, 0)
+  """
+
+  def __init__(self, patterns, cache_size = 4096):
+    self._patterns = []
+    for p in patterns:
+      if not any(p is q for q in self._patterns):
+        self._patterns.append(p)
+
+    self._alone = []
+    combinable = []
+    for j, p in enumerate(self._patterns):
+      body = _uncaptured(p.regexp)
+      if body is None:
+        self._alone.append((p.regexp.match, 1 << j))
+      else:
+        combinable.append((j, body))
+
+    self._chunks = [combinable[i:i + _CHUNK] for i in range(0, len(combinable), _CHUNK)]
+    self._alternations = {}
+    self._cache = TokenCache(cache_size)
+    super(RegexpSet, self).__init__()
+
+  def bit(self, pattern):
+    """
+    Return the bit standing for the given member in the verdicts, or 0 if
+    it isn't one.
+    """
+    for j, p in enumerate(self._patterns):
+      if p is pattern:
+        return 1 << j
+    return 0
+
+  def verdict(self, text):
+    """
+    Return a bitmask of the members that match the given token text, bit j
+    being set when member j matches.
+    """
+    v = self._cache.get(text)
+    if v is None:
+      v = self._scan(text)
+      self._cache.put(text, v)
+    return v
+
+  def _scan(self, text):
+    mask = 0
+    for c, chunk in enumerate(self._chunks):
+      start = 0
+      while start < len(chunk):
+        ms = self._alternation(c, start).match(text)
+        if ms is None:
+          break
+        j = int(ms.lastgroup[2:])
+        mask |= 1 << j
+        # Carry on with the members after the one that matched
+        while chunk[start][0] != j:
+          start += 1
+        start += 1
+    for match, bit in self._alone:
+      if match(text) is not None:
+        mask |= bit
+    return mask
+
+  def _alternation(self, c, start):
+    """
+    Return the compiled alternation of the members of chunk c from position
+    start onwards, compiling it on first use.
+    """
+    key = (c, start)
+    alt = self._alternations.get(key)
+    if alt is None:
+      alt = RE.compile('|'.join('(?P<_r%d>%s)'%(j, body) for j, body in self._chunks[c][start:]))
+      self._alternations[key] = alt
+    return alt
+
+def _uncaptured(regexp):
+  """
+  Return the source of a compiled regexp with every capturing group made
+  non-capturing, or None if it can't safely be placed in an alternation.
+
+  >>> _uncaptured(RE.compile("(?P<d>\\\\d+)(\\\\.(\\\\d{2}))?[(]"))
+  '(?:\\\\d+)(?:\\\\.(?:\\\\d{2}))?[(]'
+  >>> _uncaptured(RE.compile("(a)\\\\1")) is None, _uncaptured(RE.compile("(?i)a")) is None
+  (True, True)
+  """
+  if regexp.flags & ~RE.UNICODE:
+    return None
+  source = regexp.pattern
+  out = []
+  i = 0
+  n = len(source)
+  in_class = False
+  while i < n:
+    c = source[i]
+    if c == '\\':
+      nxt = source[i+1:i+2]
+      # Numbered backreferences depend on group numbers we are removing
+      if not in_class and nxt.isdigit() and nxt != '0':
+        return None
+      out.append(source[i:i+2])
+      i += 2
+      continue
+    if in_class:
+      if c == ']':
+        in_class = False
+      out.append(c)
+      i += 1
+      continue
+    if c == '[':
+      in_class = True
+      out.append(c)
+      i += 1
+      # A ] straight after [ or [^ is a literal
+      if source[i:i+1] == '^':
+        out.append('^')
+        i += 1
+      if source[i:i+1] == ']':
+        out.append(']')
+        i += 1
+      continue
+    if c == '(':
+      if source[i+1:i+2] != '?':
+        out.append('(?:')
+        i += 1
+        continue
+      ext = source[i+2:i+3]
+      if ext == 'P' and source[i+3:i+4] == '<':
+        close = source.find('>', i)
+        if close < 0:
+          return None
+        out.append('(?:')
+        i = close + 1
+        continue
+      if ext in (':', '=', '!', '#') or source[i+2:i+4] in ('<=', '<!'):
+        out.append('(?')
+        i += 2
+        continue
+      # Named backreferences, conditionals and inline flags
+      return None
+    out.append(c)
+    i += 1
+  body = ''.join(out)
+  try:
+    RE.compile(body)
+  except RE.error:
+    return None
+  return body
+
+# Doctest magic
+if __name__ == "__main__":
+  import doctest
+  doctest.testmod()
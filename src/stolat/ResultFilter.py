@@ -26,6 +26,19 @@ class ResultFilter(object):
     self._types = types
     super(ResultFilter, self).__init__()
 
+  def prune(self, matcher):
+    """
+    Return the given matcher with every rule that can't contribute to the
+    results this filter lets through removed; see UnionMatcher.prune.
+
+    >>> from Matcher import Matcher
+    >>> m = Matcher("dog", "NN") | Matcher("barks", "VB")
+    >>> rf = ResultFilter(["VB"])
+    >>> list(rf(rf.prune(m)("the dog barks".split())))
+    [VB{'token': 'barks'}]
+    """
+    return matcher.prune(self._types)
+
   def __call__(self, gen):
     for tok in gen:
       if isinstance(tok, MatchResult):
@@ -0,0 +1,120 @@
+"""
+Selection.py
+
+Decides which of a matcher's matches to report, according to its policy.
+A boosted rule goes on matching the same tokens for as long as they stay
+in the window, and overlapping rules can claim the same tokens; a policy
+keeps only the matches wanted.
+"""
+
+NON_OVERLAPPING = 'non-overlapping'
+LEFTMOST_LONGEST = 'leftmost-longest'
+
+OVERLAPS = (None, NON_OVERLAPPING, LEFTMOST_LONGEST)
+
+class Selection(object):
+  """
+  The per-stream state of one matcher's policy. Matches are offered with
+  the absolute stream positions of the tokens they bound, and decide()
+  returns the results to report now.
+
+  With dedupe, a match of the same type binding exactly the tokens of one
+  already reported is dropped. With the non-overlapping policy, a match
+  whose span overlaps one already reported is dropped, so the first to
+  complete wins. With leftmost-longest, matches are held back until no
+  match still to come could start earlier; then the leftmost of them, and
+  the longest of those, is reported and those overlapping it are dropped.
+
+  Only matches that can still be repeated or overlapped are remembered:
+  once a position has left the window no new match can bind it, so the
+  state never grows beyond a few windows' worth.
+
+  >>> from MatchResult import MatchResult
+  >>> a, b, ab = MatchResult("a"), MatchResult("b"), MatchResult("ab")
+  >>> s = Selection(True, LEFTMOST_LONGEST)
+  >>> s.offer([4, 5], b); s.offer([3, 4], a); s.offer([3, 4, 5], ab)
+  >>> s.decide(3)
+  []
+  >>> s.decide(4), s.decide(9)
+  ([ab{}], [])
+  """
+
+  def __init__(self, dedupe, overlap):
+    self._dedupe = dedupe
+    self._overlap = overlap
+    self._reported = {}
+    self._limit = 64
+    self._covered = -1
+    self._ready = []
+    self._pending = []
+
+  def offer(self, positions, result):
+    """
+    Offer a match binding the given stream positions.
+    """
+    key = tuple(sorted(positions))
+    if self._dedupe:
+      seen = (result.token_type, key)
+      if seen in self._reported:
+        return
+      self._reported[seen] = key[0]
+    if self._overlap is None:
+      self._ready.append(result)
+    elif key[0] <= self._covered:
+      # Overlaps a match already reported
+      return
+    elif self._overlap == NON_OVERLAPPING:
+      self._covered = key[-1]
+      self._ready.append(result)
+    else:
+      pending = self._pending
+      pending.append((key[0], -key[-1], len(pending), key[-1], result))
+
+  def decide(self, horizon):
+    """
+    Return the results to report, given that positions before horizon
+    have left the window.
+    """
+    if self._pending:
+      self._release(horizon)
+    if len(self._reported) > self._limit:
+      self._forget(horizon)
+    ready = self._ready
+    self._ready = []
+    return ready
+
+  def drain(self):
+    """
+    Return the results still held back, at the end of the stream.
+    """
+    self._release(None)
+    ready = self._ready
+    self._ready = []
+    return ready
+
+  def _release(self, horizon):
+    self._pending.sort()
+    kept = []
+    for start, negend, order, end, result in self._pending:
+      if start <= self._covered:
+        continue
+      if horizon is not None and (kept or start >= horizon):
+        # A match still to come might start at or before this one
+        kept.append((start, negend, order, end, result))
+        continue
+      self._covered = end
+      self._ready.append(result)
+    self._pending = kept
+
+  def _forget(self, horizon):
+    reported = self._reported
+    for key, start in reported.items():
+      if start < horizon:
+        del reported[key]
+    # Only sweep again once the survivors have doubled
+    self._limit = max(64, 2 * len(reported))
+
+# Doctest magic
+if __name__ == "__main__":
+  import doctest
+  doctest.testmod()
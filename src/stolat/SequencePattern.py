@@ -3,6 +3,8 @@ SequencePattern.py
 
 Take a list of patterns and apply them in sequence.
 """
+import copy
+
 from Pattern import Pattern
 
 class SequencePattern(Pattern):
@@ -14,25 +16,61 @@ class SequencePattern(Pattern):
     self.subpatterns = subpatterns
     super(SequencePattern, self).__init__("", field=field)
 
-  def matches(self, buf):
+  def scan(self, buf, start = 0, bound = None):
     """
-    Iterate binding subpatterns where possible.
+    Iterate binding subpatterns where possible. Each subpattern carries on
+    from the offset where the previous one stopped, so the buffer is only
+    ever read in place.
+
+    >>> p = Pattern("the")%"det" + Pattern("dog")%"noun"
+    >>> p.scan(["ran", "dog", "black", "the", "away"])
+    ({'det': 'the', 'noun': 'dog'}, 4)
+    >>> p.scan(["ran", "dog", "black", "the", "away"], 2)
+    (None, 5)
     """
     result = {}
-    cur_buf = [t for t in buf]
+    end = start
     for p in self.subpatterns:
-      r, rest = p.matches(cur_buf)
-      cur_buf = rest
+      r, end = p.scan(buf, end, bound)
 
       # Do we have a result for this subpattern?
       if r is None:
-        return None, cur_buf
+        return None, len(buf)
 
       # If this subpattern has a field associated, bind it in the result
-      if p.field and not p.field in result.keys():
+      if p.field and not p.field in result:
         result[p.field] = r
 
-    return result, cur_buf
+    return result, end
+
+  def _leaves(self):
+    """
+    Flatten nested sequences into their leaves, in the order scan visits
+    them.
+
+    >>> p = Pattern("a") + (Pattern("b") + Pattern("c"))
+    >>> [l.pattern for l in p._leaves()]
+    ['c', 'b', 'a']
+    """
+    return [l for p in self.subpatterns for l in p._leaves()]
+
+  def _anchor(self):
+    """
+    Every subpattern has to match, so any of their anchors will do.
+
+    >>> (Pattern("the") + Pattern("dog"))._anchor()
+    'dog'
+    """
+    for p in self.subpatterns:
+      a = p._anchor()
+      if a is not None:
+        return a
+    return None
+
+  def intern(self, vocab):
+    p = copy.copy(self)
+    p.subpatterns = [s.intern(vocab) for s in self.subpatterns]
+    return p
 
   def __add__(self, other):
     """
@@ -50,13 +88,25 @@ class SequencePattern(Pattern):
 
   def __len__(self):
     """
-    Return the length of this pattern, defined as the number of
-    subpatterns.
+    Return the length of this pattern, the number of tokens it can span:
+    the lengths of its subpatterns added up, since some span more than
+    one token.
 
     >>> len(SequencePattern([Pattern("the"),Pattern("dog")]))
     2
+
+    A matcher built from the sequence gets a window long enough for the
+    longest phrase of a gazetteer in it:
+    >>> from Pattern import word
+    >>> from GazetteerPattern import GazetteerPattern
+    >>> places = GazetteerPattern([("new york", "CITY"), ("paris", "CITY")])
+    >>> dest = (word("to") + places%"place") >> "DEST"
+    >>> len(dest._pattern), dest._buffer_length
+    (3, 3)
+    >>> [r for r in dest("we flew to new york today".split()) if not isinstance(r, str)]
+    [DEST{'place': CITY{'phrase': 'new york'}}]
     """
-    return len(self.subpatterns)
+    return sum(len(p) for p in self.subpatterns)
 
 # Doctest magic
 if __name__ == "__main__":
@@ -0,0 +1,110 @@
+"""
+Token.py
+
+A token string that remembers where in its source it was read from.
+"""
+from MatchResult import MatchResult
+
+class _Spanned(object):
+  """
+  The offsets shared by both kinds of token.
+  """
+
+  __slots__ = ()
+
+  @property
+  def span(self):
+    return (self.start, self.end)
+
+  def __reduce__(self):
+    return (_token, (self._text(self), self.start, self.end))
+
+class Token(_Spanned, str):
+  """
+  A string read from a source, carrying the byte offsets it was read
+  from. It compares and hashes as the plain string, so patterns, anchors
+  and caches treat it as one; only the offsets are extra.
+
+  >>> t = Token("dog", 4, 7)
+  >>> t == "dog", t.span, {"dog": 1}[t]
+  (True, (4, 7), 1)
+  >>> t
+  'dog'
+
+  Python won't give a str subclass slots, so the offsets of a Token are
+  kept in an instance dict. Tokens only live as long as the window holds
+  them; to match without offsets, have the Tokenizer yield plain strings.
+  """
+
+  _text = str
+
+  def __new__(cls, text, start, end):
+    tok = str.__new__(cls, text)
+    tok.start = start
+    tok.end = end
+    return tok
+
+class UnicodeToken(_Spanned, unicode):
+  """
+  A Token read from unicode text, whose offsets count characters rather
+  than bytes. Unicode subclasses can have slots, so it carries no dict.
+
+  >>> t = UnicodeToken(u"caf\\xe9", 0, 4)
+  >>> t == u"caf\\xe9", t.span
+  (True, (0, 4))
+  """
+
+  __slots__ = ('start', 'end')
+
+  _text = unicode
+
+  def __new__(cls, text, start, end):
+    tok = unicode.__new__(cls, text)
+    tok.start = start
+    tok.end = end
+    return tok
+
+def _token(text, start, end):
+  """
+  Return text as a Token or UnicodeToken, as suits it, with the given
+  offsets.
+  """
+  if isinstance(text, unicode):
+    return UnicodeToken(text, start, end)
+  return Token(text, start, end)
+
+def _span(tok):
+  """
+  Return the source span of a token or result, or None if it has none.
+  """
+  if isinstance(tok, _Spanned):
+    return (tok.start, tok.end)
+  if isinstance(tok, MatchResult):
+    return tok._span
+  return None
+
+def _covering(toks):
+  """
+  Return the span covering those of the tokens that have one, or None.
+
+  >>> _covering([Token("new", 10, 13), "in", Token("york", 14, 18)])
+  (10, 18)
+  """
+  spans = [s for s in map(_span, toks) if s is not None]
+  if not spans:
+    return None
+  return (min(s[0] for s in spans), max(s[1] for s in spans))
+
+def _respan(text, tok):
+  """
+  Return text as a Token with the offsets of tok, if tok had them; used
+  where a token is replaced, as by a correction.
+  """
+  if isinstance(tok, _Spanned):
+    return _token(text, tok.start, tok.end)
+  return text
+
+# Doctest magic
+if __name__ == "__main__":
+  import doctest
+  doctest.testmod()
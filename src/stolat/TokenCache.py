@@ -0,0 +1,58 @@
+"""
+TokenCache.py
+
+A small bounded cache for per-token verdicts. Tokens recur constantly as the
+window slides and across a document, so remembering the last few thousand
+verdicts saves re-running expensive tests on them.
+"""
+import collections
+import threading
+
+class TokenCache(object):
+  """
+  A mapping that holds at most capacity entries, forgetting the oldest
+  entry first. Verdicts are pure functions of the token, so a cache may be
+  shared between streams and threads; losing an entry only costs a
+  recomputation. Lookups take no lock, but storing does, so that threads
+  can't evict past each other and leave the order out of step with the
+  entries.
+
+  >>> c = TokenCache(2)
+  >>> c.put("a", 1); c.put("b", 2); c.put("c", 3)
+  >>> c.get("a"), c.get("b"), c.get("c")
+  (None, 2, 3)
+  """
+
+  def __init__(self, capacity = 4096):
+    self._capacity = capacity
+    self._values = {}
+    self._order = collections.deque()
+    self._lock = threading.Lock()
+    self.get = self._values.get
+
+  def __len__(self):
+    return len(self._values)
+
+  def put(self, key, value):
+    values = self._values
+    with self._lock:
+      if key not in values:
+        if len(values) >= self._capacity:
+          values.pop(self._order.popleft(), None)
+        self._order.append(key)
+      values[key] = value
+
+  def __getstate__(self):
+    # The bound get method and the lock can't be pickled; rebuild them on
+    # load
+    return {'_capacity': self._capacity, '_values': self._values, '_order': self._order}
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self._lock = threading.Lock()
+    self.get = self._values.get
+
+# Doctest magic
+if __name__ == "__main__":
+  import doctest
+  doctest.testmod()
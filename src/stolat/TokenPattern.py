@@ -4,6 +4,8 @@ TokenPattern.py
 Implements a pattern that matches a MatchResult in the stream. Use to
 simulate recursion.
 """
+from itertools import islice
+
 from Pattern import Pattern
 from MatchResult import MatchResult
 
@@ -13,7 +15,7 @@ class TokenPattern(Pattern):
     self.token_type = token_type
     super(TokenPattern, self).__init__()
 
-  def matches(self, buf):
+  def scan(self, buf, start = 0, bound = None):
     """
     Match the buffer against a particular token type.
 
@@ -21,13 +23,30 @@ class TokenPattern(Pattern):
     >>> TokenPattern('CN').matches(buf)
     (CN{'noun': 'dog'}, ['dog', 'the'])
     """
-    buf_length = len(buf)
-    for i in range(buf_length):
-      t = buf[i]
+    token_type = self.token_type
+    for i, t in enumerate(islice(buf, start, None), start):
       if isinstance(t, MatchResult):
-        if t.token_type == self.token_type:
-          return t, buf[i+1:]
-    return None, []
+        if t.token_type == token_type:
+          if bound is not None:
+            bound.append(i)
+          return t, i + 1
+    return None, len(buf)
+
+  def _anchor(self):
+    return (MatchResult, self.token_type)
+
+  def _match_token(self, tok):
+    """
+    Test a single token against the token type, returning it if it is a
+    MatchResult of that type.
+    """
+    if isinstance(tok, MatchResult) and tok.token_type == self.token_type:
+      return tok
+    return None
+
+  def intern(self, vocab):
+    # Token types aren't words, so there is nothing to look up
+    return self
 
 token = TokenPattern
 
@@ -0,0 +1,149 @@
+"""
+Tokenizer.py
+
+Splits text, strings or files, into a lazy stream of Tokens that carry
+their byte offsets.
+"""
+import mmap
+import re as RE
+
+from Token import _token
+
+class Tokenizer(object):
+  """
+  A callable object that yields the tokens matched by a regexp, by default
+  runs of non-space characters, each as a Token holding its byte offsets
+  in the source. Nothing is read ahead of the tokens asked for.
+
+  Files are memory-mapped and scanned in place, so the only copies made
+  are of the tokens themselves and a file of any size is tokenized in
+  constant memory. Streams that can't be mapped, such as pipes, are read
+  in chunks. A token may not straddle two chunks, so the regexp has to
+  match every prefix of any token it matches, as \S+ and [a-z]+ do.
+
+  With lower set, tokens are lowercased; their offsets still refer to the
+  source. With offsets unset, plain strings are yielded, as is usual for
+  building a Corrector's corpus. Unicode text gives UnicodeTokens, whose
+  offsets count characters.
+
+  >>> tokenize = Tokenizer()
+  >>> toks = list(tokenize("the  dog ran"))
+  >>> toks, [t.span for t in toks]
+  (['the', 'dog', 'ran'], [(0, 3), (5, 8), (9, 12)])
+  >>> list(Tokenizer("[a-z]+", RE.I, lower = True, offsets = False)("The Dog, ran."))
+  ['the', 'dog', 'ran']
+  >>> toks = list(tokenize(u"caf\\xe9 x"))
+  >>> toks, [t.span for t in toks]
+  ([u'caf\\xe9', u'x'], [(0, 4), (5, 6)])
+
+  Results matched from Tokens record the span of source they cover, so
+  the source can be sliced rather than copied:
+  >>> from Pattern import word
+  >>> cn = (word("big") + word("dog")%"noun") >> "CN"
+  >>> text = "a big  dog barked"
+  >>> r = [t for t in cn(Tokenizer()(text)) if not isinstance(t, str)][0]
+  >>> r.span, text[r.span[0]:r.span[1]]
+  ((2, 10), 'big  dog')
+  """
+
+  def __init__(self, pattern = r"\S+", flags = 0, lower = False, offsets = True, chunk_size = 1 << 20):
+    self._regexp = RE.compile(pattern, flags)
+    self._lower = lower
+    self._offsets = offsets
+    self._chunk_size = chunk_size
+    super(Tokenizer, self).__init__()
+
+  def __call__(self, text):
+    """
+    Tokenize a string, with offsets into it.
+    """
+    return self._tokens(text, 0, None)
+
+  def file(self, path):
+    """
+    Tokenize the file at the given path, mapping it into memory.
+    """
+    f = open(path, 'rb')
+    try:
+      try:
+        source = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+      except (ValueError, EnvironmentError):
+        # Empty files, and files that can't be mapped, are read instead
+        source = None
+      if source is None:
+        for tok in self.stream(f):
+          yield tok
+        return
+      try:
+        for tok in self._tokens(source, 0, None):
+          yield tok
+      finally:
+        source.close()
+    finally:
+      f.close()
+
+  def stream(self, f, chunk_size = None):
+    """
+    Tokenize a file object, reading it a chunk at a time.
+
+    >>> import StringIO
+    >>> toks = list(Tokenizer().stream(StringIO.StringIO("a big dog barked"), 3))
+    >>> toks, [t.span for t in toks]
+    (['a', 'big', 'dog', 'barked'], [(0, 1), (2, 5), (6, 9), (10, 16)])
+    >>> toks = list(Tokenizer().stream(StringIO.StringIO("a " + "b" * 50 + " c"), 4))
+    >>> [len(t) for t in toks], toks[1].span
+    ([1, 50, 1], (2, 52))
+    """
+    chunk_size = chunk_size or self._chunk_size
+    # A match running to the end of what has been scanned may go on in the
+    # next chunk, so it is held back, with the chunks read since, until it
+    # is scanned again
+    held = ''
+    read = []
+    size = 0
+    base = 0
+    while True:
+      chunk = f.read(chunk_size)
+      if chunk:
+        read.append(chunk)
+        size += len(chunk)
+        # Only scan a held match again once as much again has been read,
+        # so a token spanning many chunks still takes linear time
+        if size < len(held):
+          continue
+      buf = held + ''.join(read)
+      read = []
+      size = 0
+      used = [len(buf)]
+      for tok in self._tokens(buf, base, used if chunk else None):
+        yield tok
+      if not chunk:
+        return
+      base += used[0]
+      held = buf[used[0]:]
+
+  def _tokens(self, source, base, used):
+    """
+    Yield the tokens in source, offset by base. If used is given, a match
+    that runs to the end of the source is not yielded and used[0] is set
+    to where it starts.
+    """
+    lower = self._lower
+    offsets = self._offsets
+    end = len(source)
+    for m in self._regexp.finditer(source):
+      if used is not None and m.end() == end:
+        used[0] = m.start()
+        return
+      text = m.group()
+      if lower:
+        text = text.lower()
+      if offsets:
+        yield _token(text, base + m.start(), base + m.end())
+      else:
+        yield text
+
+# Doctest magic
+if __name__ == "__main__":
+  import doctest
+  doctest.testmod()
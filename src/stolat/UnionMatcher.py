@@ -4,18 +4,93 @@ UnionMatcher.py
 Implements a matcher that matches a set of sub-matchers.
 """
 
+import itertools
+
 from Matcher import Matcher
+from MatchResult import MatchResult
+from RegexpPattern import RegexpPattern
+from RegexpSet import RegexpSet
+from FuzzyPattern import FuzzyPattern
+from FuzzySet import FuzzySet
+from Selection import LEFTMOST_LONGEST
+
+# Numbers the selections shared by the rules of a union
+_selections = itertools.count()
 
 class UnionMatcher(Matcher):
   """
   A matcher that matches a set of sub-matchers.
+
+  Submatchers that need a particular token in the window are indexed by
+  that token, so only the ones that could fire are run for each window.
+  The regexps of all the rules are folded into one RegexpSet, and rules
+  that need a token matching one of them are indexed by its bit in the
+  set's verdicts. Fuzzy words are likewise folded into one FuzzySet. The
+  rest (compiled automata) are run every time.
+
+  >>> from Pattern import word
+  >>> from RegexpPattern import re
+  >>> m = Matcher('dog') | (word('the') + word('cat') >> 'CN') | (re('\d+') >> 'NUM')
+  >>> sorted(m._index.items())
+  [('cat', 2), ('dog', 1)]
+  >>> m._fallback, m._regexp_index
+  (4, {})
+  >>> m = m | (re('[A-Z]+') >> 'ABBR')
+  >>> m._fallback, sorted(m._regexp_index.items())
+  (0, [(1, 4), (2, 8)])
+
+  >>> from FuzzyPattern import fuzzy_word
+  >>> m = (fuzzy_word("january", 2) >> "JAN") | (fuzzy_word("february", 2) >> "FEB")
+  >>> m._fallback, sorted(m._fuzzy_index.items())
+  (0, [(1, 1), (2, 2)])
+  >>> list(m("in febuary".split()))
+  ['in', 'febuary', FEB{}]
   """
 
   def __init__(self, submatchers):
     self._submatchers = submatchers
-    maxlength = max(submatchers, key=lambda x: x._buffer_length)._buffer_length
+    # A union may be left with no rules at all once pruned
+    maxlength = max([m._buffer_length for m in submatchers] or [1])
     super(UnionMatcher, self).__init__(buffer_length = maxlength)
 
+    # Let the regexps of all the rules share one combined scan per token
+    self._regexps = None
+    regexps = [p for p in self._patterns() if isinstance(p, RegexpPattern)]
+    if len(regexps) > 1:
+      self._regexps = RegexpSet(regexps)
+    self._fuzzy = None
+    fuzzy = [p for p in self._patterns() if isinstance(p, FuzzyPattern)]
+    if len(fuzzy) > 1:
+      self._fuzzy = FuzzySet(fuzzy)
+    # Interned rules see token ids, and the sets have to be asked about
+    # their text
+    self._vocab = next((p._vocab for p in regexps + fuzzy), None)
+
+    # Map anchor tokens (and regexp bits) to bitmasks of submatcher
+    # positions, so that the candidates for a window come out in submatcher
+    # order
+    self._index = {}
+    self._regexp_index = {}
+    self._fuzzy_index = {}
+    self._fallback = 0
+    for i, m in enumerate(submatchers):
+      a = m._anchor()
+      p = m._regexp_anchor() if self._regexps is not None else None
+      f = m._fuzzy_anchor() if self._fuzzy is not None else None
+      if m._overlap == LEFTMOST_LONGEST:
+        # Held back matches are released as the window moves on
+        self._fallback |= 1 << i
+      elif a is not None:
+        self._index[a] = self._index.get(a, 0) | 1 << i
+      elif p is not None:
+        bit = self._regexps.bit(p)
+        self._regexp_index[bit] = self._regexp_index.get(bit, 0) | 1 << i
+      elif f is not None:
+        bit = self._fuzzy.bit(f)
+        self._fuzzy_index[bit] = self._fuzzy_index.get(bit, 0) | 1 << i
+      else:
+        self._fallback |= 1 << i
+
   def __or__(self, other):
     """
     Special version to cope with chains of unions.
@@ -30,7 +105,132 @@ class UnionMatcher(Matcher):
     submatchers = self._submatchers + [other]
     return UnionMatcher(submatchers)
 
-  def _match(self, buf):
+  def compile(self):
+    """
+    Compile every submatcher that can be, keeping the union's buffer length.
+
+    >>> from Pattern import word
+    >>> m = Matcher('dog') | (word('the') + word('cat') >> 'CN') ^ 2
+    >>> c = m.compile()
+    >>> [s.__class__.__name__ for s in c._submatchers], c._buffer_length
+    (['Matcher', 'AutomatonMatcher'], 4)
+    """
+    union = UnionMatcher([m.compile() for m in self._submatchers])
+    return union ^ (self._buffer_length - union._buffer_length)
+
+  def _with_policy(self, dedupe, overlap, shared):
+    """
+    Apply the policy to every rule in the union. The rules share one
+    selection, so overlaps are resolved between rules as well as within
+    them.
+
+    >>> from Pattern import word
+    >>> np = ((word("big") + word("dog")%"n") >> "NP") ^ 2
+    >>> npl = ((word("the") + word("big") + word("dog")%"n") >> "NPL") ^ 2
+    >>> list((np | npl).policy(overlap = "non-overlapping")("the big dog ran".split()))
+    ['the', 'big', 'dog', NP{'n': 'dog'}, 'ran']
+    >>> list((np | npl).policy(overlap = "leftmost-longest")("the big dog ran".split()))
+    ['the', 'big', 'dog', 'ran', NPL{'n': 'dog'}]
+    """
+    if shared is None:
+      shared = ('selection', next(_selections))
+    union = UnionMatcher([m._with_policy(dedupe, overlap, shared) for m in self._submatchers])
+    return union ^ (self._buffer_length - union._buffer_length)
+
+  def prune(self, types):
+    """
+    Return a union of only the rules needed to produce results of the
+    given types: the rules producing them, and, transitively, the rules
+    producing the results those build on with token(). Nested unions are
+    flattened and the union's buffer length is kept. Every other rule is
+    dropped, so it no longer builds results nobody wants.
+
+    This can change what the kept rules match. The results of the dropped
+    rules no longer take up room in the window, so the rules kept see
+    further back than they did, and may find matches that a full run
+    would have missed. Knowing how much room to leave would mean running
+    the dropped rules, so pruning is never done behind the caller's back:
+    it is up to the caller to ask for it where that is acceptable.
+
+    >>> from Pattern import word
+    >>> from TokenPattern import token
+    >>> det = Matcher("the", "DET")
+    >>> cn = Matcher("dog", "CN")
+    >>> adj = Matcher("big", "ADJ")
+    >>> np = ((token("DET")%"det" + token("CN")%"cn") >> "NP") ^ 1
+    >>> vp = ((token("NP")%"subj" + word("barked")) >> "VP") ^ 2
+    >>> m = det | adj | cn | np | vp
+    >>> p = m.prune(["NP"])
+    >>> [s._match_type for s in p._submatchers], p._buffer_length == m._buffer_length
+    (['DET', 'CN', 'NP'], True)
+    >>> list(p.policy()("the dog barked".split()))
+    ['the', DET{'token': 'the'}, 'dog', CN{'token': 'dog'}, NP{'det': DET{'token': 'the'}, 'cn': CN{'token': 'dog'}}, 'barked']
+    >>> m.prune(["PP"])._submatchers
+    []
+
+    Over "the big dog", the ADJ result pushes "the" out of the NP rule's
+    window in the whole union, but not in the pruned one:
+    >>> def found(matcher, text):
+    ...   return [r for r in matcher.policy()(text.split())
+    ...           if isinstance(r, MatchResult) and r.token_type == "NP"]
+    >>> text = "the dog barked at the big dog"
+    >>> len(found(m, text)), len(found(p, text))
+    (1, 2)
+
+    Given room for the dropped results, the rules kept find the same:
+    >>> m = det | adj | cn | np ^ 2 | vp
+    >>> found(m.prune(["NP"]), text) == found(m, text)
+    True
+    """
+    rules = list(self._rules())
+    needed = set(types)
+    kept = [False] * len(rules)
+    grown = True
+    while grown:
+      grown = False
+      for i, m in enumerate(rules):
+        if not kept[i] and m._produces() & needed:
+          kept[i] = True
+          needed |= m._requires()
+          grown = True
+    union = UnionMatcher([m for m, k in zip(rules, kept) if k])
+    union._keep_original = self._keep_original
+    return union ^ (self._buffer_length - union._buffer_length)
+
+  def _rules(self):
+    """
+    Yield the rules of this union, and of any unions nested in it, in the
+    order they run.
+    """
+    for m in self._submatchers:
+      if isinstance(m, UnionMatcher):
+        for r in m._rules():
+          yield r
+      else:
+        yield m
+
+  def _produces(self):
+    return set(t for m in self._submatchers for t in m._produces())
+
+  def _drain(self, context):
+    return [r for m in self._submatchers for r in m._drain(context)]
+
+  def intern(self, vocab):
+    """
+    Return a copy of this union that runs over token ids from the given
+    Vocabulary; the regexps and fuzzy words are asked about the ids' text.
+
+    >>> from Vocabulary import Vocabulary
+    >>> from RegexpPattern import re
+    >>> m = (re('\d+') >> 'NUM') | (re('[A-Z]+') >> 'ABBR')
+    >>> v = Vocabulary()
+    >>> list(v.decode(m.intern(v)(v.encode("the BBC at 10".split()))))
+    ['the', 'BBC', ABBR{}, 'at', '10', NUM{}]
+    """
+    union = UnionMatcher([m.intern(vocab) for m in self._submatchers])
+    return union ^ (self._buffer_length - union._buffer_length)
+
+  def _match(self, buf, context):
     """
     Matches all the submatchers in parallel.
 
@@ -40,11 +240,60 @@ class UnionMatcher(Matcher):
     >>> list(m("the dog chases the cat".split()))
     ['the', 'dog', animal{'token': 'dog'}, 'chases', 'the', 'cat', animal{'token': 'cat'}]
     """
+    index = self._index
+    candidates = self._fallback
+    hits = 0
+    near = 0
+    verdict = self._regexp_index and self._regexps.verdict
+    fuzzy = self._fuzzy_index and self._fuzzy.verdict
+    vocab = self._vocab
+    for t in buf:
+      if isinstance(t, MatchResult):
+        t = (MatchResult, t.token_type)
+      elif verdict or fuzzy:
+        text = str(t) if vocab is None else vocab.string(t)
+        if verdict:
+          hits |= verdict(text)
+        if fuzzy:
+          near |= fuzzy(text)
+      try:
+        candidates |= index.get(t, 0)
+      except TypeError:
+        # Unhashable tokens can't be anchors
+        pass
+
+    # Each bit set in the verdicts is a regexp some token matched
+    regexp_index = self._regexp_index
+    while hits:
+      low = hits & -hits
+      candidates |= regexp_index.get(low, 0)
+      hits ^= low
+    fuzzy_index = self._fuzzy_index
+    while near:
+      low = near & -near
+      candidates |= fuzzy_index.get(low, 0)
+      near ^= low
+
     results = []
-    for m in self._submatchers:
-      results += m._match(buf)
+    submatchers = self._submatchers
+    while candidates:
+      low = candidates & -candidates
+      results += submatchers[low.bit_length() - 1]._match(buf, context)
+      candidates ^= low
     return results
 
+  def _anchor(self):
+    return None
+
+  def _regexp_anchor(self):
+    return None
+
+  def _fuzzy_anchor(self):
+    return None
+
+  def _patterns(self):
+    return [p for m in self._submatchers for p in m._patterns()]
+
 # Doctest magic
 if __name__ == '__main__':
   import doctest
@@ -0,0 +1,263 @@
+"""
+VectorMatcher.py
+
+Runs a matcher over whole documents held in memory, using NumPy to find the
+positions where rules could fire so that the matcher itself only runs
+there. Needs NumPy; the rest of the library does not.
+"""
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+from Matcher import Matcher, _hashable
+from MatchContext import MatchContext
+from MatchResult import MatchResult
+from Pattern import Pattern
+from RegexpPattern import RegexpPattern
+from PatternMatcher import PatternMatcher
+from AutomatonMatcher import AutomatonMatcher
+from UnionMatcher import UnionMatcher
+from Selection import LEFTMOST_LONGEST
+
+class VectorMatcher(object):
+  """
+  Applies a matcher to a complete document and returns the same list of
+  tokens and results that streaming the document through the matcher
+  would.
+
+  The document is encoded as an array of token ids, and each leaf pattern
+  is turned into the sorted array of positions it matches: literal words
+  by grouping the ids with one sort, regexps by testing each distinct
+  token once. A rule can only fire in windows holding its rarest leaf;
+  at those positions its leaves are chained back from the newest with
+  binary searches, exactly as SequencePattern.scan binds them, and the
+  rule could fire only if the chain starts within the window, boost
+  included. Rules built on token() can only fire once results are in the
+  window.
+
+  The matcher is then run for real at those candidate positions, and at
+  every position while a result is still in the window. Elsewhere tokens
+  are copied through and pushed into the window in bulk. Matchers that
+  keep state from token to token can't skip positions, so compiled
+  automata are run in their uncompiled form; grammars containing other
+  stateful matchers are simply streamed.
+
+  >>> from Pattern import word
+  >>> from RegexpPattern import re
+  >>> from TokenPattern import token
+  >>> cn = ((word("the") + re("cat|dog")%"noun") >> "CN") ^ 2
+  >>> vp = ((token("CN")%"subj" + word("barked")) >> "VP") ^ 1
+  >>> m = cn | vp
+  >>> doc = "the big dog barked at the cat".split()
+  >>> VectorMatcher(m)(doc) == list(m(doc))
+  True
+  >>> from ResultFilter import ResultFilter
+  >>> ResultFilter(["VP"])(VectorMatcher(m)(doc)).next()
+  VP{'subj': CN{'noun': {'noun': 'dog'}}}
+  """
+
+  def __init__(self, matcher):
+    if numpy is None:
+      raise ImportError("VectorMatcher needs NumPy")
+    self._matcher = matcher
+    try:
+      self._replay = _replayable(matcher)
+    except TypeError:
+      # Stream grammars we can't see into
+      self._replay = None
+    super(VectorMatcher, self).__init__()
+
+  def __call__(self, document):
+    """
+    Match a document, given as a sequence of tokens, returning a list.
+    """
+    toks = list(document)
+    if self._replay is None:
+      return list(self._matcher(toks))
+
+    ids, keys = _encode(toks)
+    if ids is None:
+      return list(self._matcher(toks))
+
+    length = self._replay._buffer_length
+    candidates = _candidates(self._replay, _Occurrences(ids, keys), length)
+    # Results from an earlier stage may complete rules too
+    candidates = numpy.union1d(candidates, numpy.flatnonzero(ids < 0))
+    return self._run(toks, candidates.tolist(), length)
+
+  def _run(self, toks, candidates, length):
+    """
+    Stream the tokens through the matcher, running it only at candidate
+    positions and wherever a result is still in the window.
+    """
+    matcher = self._replay
+    keep = matcher._keep_original
+    context = MatchContext(length)
+    window = context.window
+    out = []
+    n = len(toks)
+    i = c = 0
+    forced = 0
+    while i < n:
+      if i >= forced:
+        while c < len(candidates) and candidates[c] < i:
+          c += 1
+        j = candidates[c] if c < len(candidates) else n
+        if j > i:
+          # Nothing can fire before j: copy the tokens through
+          if keep:
+            out.extend(toks[i:j])
+          window.extendleft(toks[max(i, j - length):j])
+          context.pushed += j - i
+          i = j
+          continue
+
+      tok = toks[i]
+      before = len(out)
+      matcher._feed(context, tok, out)
+      if isinstance(tok, MatchResult) or len(out) > before + keep:
+        # Rules may build on the results while they are in the window
+        forced = i + length
+      i += 1
+    out.extend(matcher._drain(context))
+    return out
+
+def _replayable(matcher):
+  """
+  Return a matcher equivalent to the given one that holds no state between
+  tokens, so it can be skipped over positions where nothing fires. Raises
+  TypeError for matchers we don't know to be stateless.
+  """
+  if matcher._overlap == LEFTMOST_LONGEST:
+    # Held back matches are released as the window moves on
+    raise TypeError("cannot replay a leftmost-longest policy")
+  if isinstance(matcher, AutomatonMatcher):
+    m = PatternMatcher(matcher._pattern, matcher._match_type, matcher._keep_original)
+    return m ^ (matcher._buffer_length - m._buffer_length)
+  if isinstance(matcher, UnionMatcher):
+    union = UnionMatcher([_replayable(m) for m in matcher._submatchers])
+    union._keep_original = matcher._keep_original
+    return union ^ (matcher._buffer_length - union._buffer_length)
+  if type(matcher) in (Matcher, PatternMatcher):
+    return matcher
+  raise TypeError("cannot replay matcher of type %s"%type(matcher).__name__)
+
+def _encode(toks):
+  """
+  Return an array of ids for the tokens, with MatchResults as -1, and the
+  list of distinct tokens the ids refer to. Returns None for the ids if a
+  token can't be used as a key.
+  """
+  index = {}
+  setdefault = index.setdefault
+  try:
+    ids = [-1 if isinstance(t, MatchResult) else setdefault(t, len(index)) for t in toks]
+  except TypeError:
+    return None, None
+  keys = [None] * len(index)
+  for t, i in index.iteritems():
+    keys[i] = t
+  return numpy.array(ids, dtype = numpy.int32), keys
+
+class _Occurrences(object):
+  """
+  Finds, and remembers, the positions in one document that each leaf of a
+  grammar matches.
+  """
+
+  def __init__(self, ids, keys):
+    self._ids = ids
+    self._keys = keys
+    self._index = dict((k, i) for i, k in enumerate(keys))
+    # Group the positions by id with one stable sort, so that the
+    # occurrences of a word are a sorted slice; MatchResults sort first
+    self._order = numpy.argsort(ids, kind = 'mergesort').astype(numpy.int32)
+    counts = numpy.bincount(ids + 1, minlength = len(keys) + 1)
+    self._starts = numpy.concatenate(([0], numpy.cumsum(counts)))
+    self._found = {}
+
+  def __len__(self):
+    return len(self._ids)
+
+  def of(self, leaf):
+    """
+    Return the sorted array of positions the leaf matches, or None if it
+    can't be worked out a token at a time.
+    """
+    # Leaves are often repeated between rules; literals are remembered by
+    # their word, regexps by their compiled form, other leaves by identity
+    key = leaf
+    if type(leaf) is Pattern and _hashable(leaf.pattern) is not None:
+      key = (Pattern, leaf.pattern)
+    elif type(leaf) is RegexpPattern:
+      key = (RegexpPattern, leaf.regexp, leaf._vocab)
+    if key not in self._found:
+      self._found[key] = self._find(leaf)
+    return self._found[key]
+
+  def _find(self, leaf):
+    if type(leaf) is Pattern:
+      i = self._index.get(_hashable(leaf.pattern))
+      if i is None:
+        return numpy.zeros(0, dtype = numpy.int32)
+      return self._order[self._starts[i + 1]:self._starts[i + 2]]
+
+    if type(leaf) is RegexpPattern:
+      # Only whether the regexp matches counts here, not what it binds
+      match = leaf.regexp.match
+      text = str if leaf._vocab is None else leaf._vocab.string
+      table = [match(text(k)) is not None for k in self._keys]
+    else:
+      from AutomatonMatcher import _leaf_test
+      try:
+        test = _leaf_test(leaf)
+      except TypeError:
+        return None
+      table = [test(k) is not None for k in self._keys]
+    table = numpy.array(table + [False], dtype = bool)
+    # MatchResults are -1, which picks the extra False entry
+    return numpy.flatnonzero(table[self._ids]).astype(numpy.int32)
+
+def _candidates(matcher, occurrences, length):
+  """
+  Return a sorted array of the positions where the matcher could fire with
+  a window of the given length holding no results.
+  """
+  n = len(occurrences)
+  if isinstance(matcher, UnionMatcher):
+    found = [_candidates(m, occurrences, length) for m in matcher._submatchers]
+    if not found:
+      return numpy.zeros(0, dtype = numpy.int32)
+    return numpy.unique(numpy.concatenate(found))
+
+  if type(matcher) is Matcher:
+    # A plain matcher only looks at the newest token
+    return occurrences.of(Pattern(matcher._pattern))
+
+  leaves = matcher._pattern._leaves()
+  found = [occurrences.of(leaf) for leaf in leaves]
+  if any(f is None for f in found):
+    return numpy.arange(n, dtype = numpy.int32)
+  if any(len(f) == 0 for f in found):
+    return numpy.zeros(0, dtype = numpy.int32)
+
+  # Every leaf has to be in the window, so the rarest one narrows the
+  # positions down to the windows that hold it
+  rarest = min(found, key = len)
+  positions = numpy.unique((rarest[:, None] + numpy.arange(length)).ravel())
+  positions = positions[positions < n]
+
+  # Chain the leaves back from each position, newest first, as scan does
+  q = positions
+  for f in found:
+    i = numpy.searchsorted(f, q, 'right') - 1
+    start = numpy.where((i >= 0) & (q >= 0), f[numpy.maximum(i, 0)], -1)
+    # The next leaf has to bind an older token
+    q = start - 1
+  return positions[start >= numpy.maximum(positions - length + 1, 0)]
+
+# Doctest magic
+if __name__ == "__main__":
+  import doctest
+  doctest.testmod()
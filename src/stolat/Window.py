@@ -0,0 +1,98 @@
+"""
+Window.py
+
+A fixed-capacity sliding window over a token stream. Matchers push each
+token into their window and patterns read it newest-first, so the window
+has to be cheap to advance and cheap to index.
+"""
+import collections
+import itertools
+
+class Window(collections.deque):
+  """
+  A ring buffer holding the most recent tokens of a stream, newest first.
+  Once the window is full, pushing a token drops the oldest one in constant
+  time. Indexing reads straight from the ring without copying.
+
+  >>> w = Window(maxlen=3)
+  >>> for t in "the dog ran away".split():
+  ...   w.push(t)
+  >>> w[0], w[2], len(w)
+  ('away', 'dog', 3)
+  """
+
+  push = collections.deque.appendleft
+
+  def view(self, start):
+    """
+    Return a reverse-indexed view of this window starting at the given
+    offset. The view shares the window's storage.
+
+    >>> w = Window("away ran dog the".split(), 4)
+    >>> v = w.view(1)
+    >>> v[0], len(v)
+    ('ran', 3)
+    """
+    return WindowView(self, start)
+
+class WindowView(object):
+  """
+  A read-only view onto a Window from a fixed offset. Views are only valid
+  until the window is next pushed to. Iterating a view runs at the same
+  speed as iterating the window itself, so scans should prefer it to
+  indexing.
+  """
+
+  def __init__(self, window, start):
+    self._window = window
+    self._start = start
+
+  def __len__(self):
+    return max(0, len(self._window) - self._start)
+
+  def __getitem__(self, i):
+    """
+    Index into the view, relative to its offset.
+
+    >>> v = Window("away ran dog the".split(), 4).view(2)
+    >>> v[0], v[-1]
+    ('dog', 'the')
+    >>> v[2]
+    Traceback (most recent call last):
+      ...
+    IndexError: window index out of range
+    """
+    n = len(self)
+    if i < 0:
+      i += n
+    if i < 0 or i >= n:
+      raise IndexError("window index out of range")
+    return self._window[self._start + i]
+
+  def __iter__(self):
+    return itertools.islice(self._window, self._start, None)
+
+  def view(self, start):
+    return WindowView(self._window, self._start + start)
+
+  def __repr__(self):
+    return repr(list(self))
+
+def tail(buf, start):
+  """
+  Return the part of the buffer from the given offset onwards. Windows and
+  their views are not copied; plain sequences are sliced as before.
+
+  >>> tail(['ran', 'dog', 'the'], 1)
+  ['dog', 'the']
+  >>> tail(Window("ran dog the".split(), 3), 1)
+  ['dog', 'the']
+  """
+  if isinstance(buf, (Window, WindowView)):
+    return buf.view(start)
+  return buf[start:]
+
+# Doctest magic invocation
+if __name__ == "__main__":
+  import doctest
+  doctest.testmod()
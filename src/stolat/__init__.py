@@ -5,4 +5,16 @@ from Corrector import Corrector
 from ResultFilter import ResultFilter
 from Pattern import word
 from RegexpPattern import re
+from FuzzyPattern import fuzzy_word
 from TokenPattern import token
+from BatchExtractor import BatchExtractor
+from Gazetteer import Gazetteer
+from GazetteerPattern import gazetteer
+from Vocabulary import Vocabulary
+from VectorMatcher import VectorMatcher
+from ChartMatcher import ChartMatcher
+from Pipeline import Pipeline
+from Profile import Profile
+from Feeder import Feeder
+from Token import Token, UnicodeToken
+from Tokenizer import Tokenizer